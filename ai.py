@@ -3,23 +3,26 @@
 import openai
 import logging
 import asyncio
-from openai import RateLimitError, OpenAIError
+import hashlib
+import random
+import string
+import time
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from openai import (
+    AsyncOpenAI, RateLimitError, OpenAIError, APIConnectionError, InternalServerError
+)
+from response_cache import chave_resposta
+import streaming
+import token_budget
 
-async def consultar_openai(produtos, respostas, config, callback=None):
-    produtos_joined = "\n".join(produtos)
+DEFAULT_MODEL = "gpt-4o-mini-2024-07-18"
 
-    # Get the prompt template from the config
-    prompt_template = config.get('prompts', {}).get('prompt_template', '')
-    if not prompt_template:
-        # Default prompt template
-        prompt_template = """
+# Template padrão: instruções fixas primeiro; os produtos selecionados (top-k da
+# busca para as respostas) e os dados do cliente mudam a cada consulta e vêm por último
+DEFAULT_PROMPT_TEMPLATE = """
 Você é um especialista em produtos químicos e tratamento de superfícies metálicas. Utilize as informações fornecidas pelo cliente para recomendar os melhores produtos disponíveis.
 
-{informacoes_cliente}
-
-# Produtos Disponíveis:
-{produtos}
-
 # Formato de Saída:
 - Resumo das necessidades do cliente.
 - Produto(s) recomendado(s).
@@ -29,61 +32,426 @@ Você é um especialista em produtos químicos e tratamento de superfícies met
 # Notes:
 - Utilize linguagem técnica adequada ao nível de conhecimento do cliente.
 - Apresente a resposta de forma clara, coesa e fluida, evitando o uso de formatação com asteriscos ou marcadores.
+
+# Produtos Disponíveis:
+{produtos}
+
+# Informações do Cliente:
+{informacoes_cliente}
 """
+
+# Cliente da API e novas tentativas (podem ser sobrescritos em config['openai'])
+OPENAI_DEFAULTS = {
+    "base_url": None,           # ex.: servidor local compatível com a API da OpenAI
+    "timeout": 60.0,            # segundos por tentativa
+    "connect_timeout": 10.0,
+    "max_attempts": 5,
+    "backoff_base": 1.0,
+    "backoff_max": 30.0,
+    "retry_after_max": None,    # maior Retry-After aceito; None = backoff_max
+    "hedge": False,             # dispara um segundo pedido se o primeiro token demorar
+    "hedge_deadline": 4.0,      # segundos sem nenhum token antes do segundo pedido
+    "fallback_model": None,     # modelo do segundo pedido; None = o mesmo modelo
+}
+
+# Contagem de tokens da última consulta: {'prompt': ..., 'completion': ..., 'prefix_hash': ...};
+# {'error': True} enquanto ela não termina ou se terminou com erro
+ultimo_uso = {}
+
+# Quantas consultas precisaram do segundo pedido e qual deles venceu
+hedge_stats = {"hedged": 0, "primary_wins": 0, "fallback_wins": 0}
+
+_formatter = string.Formatter()
+
+
+class PromptTemplate:
+    """Template do prompt analisado uma única vez.
+
+    Equivale a ``str.format``, mas guarda os trechos já separados e sabe até
+    onde o prompt é igual para todos os clientes (o prefixo estável). Todos os
+    campos dependem da consulta, inclusive ``{produtos}``, que traz só os
+    produtos selecionados para as respostas do cliente; o prefixo estável
+    termina, portanto, no primeiro campo.
+    """
+
+    def __init__(self, texto):
+        self.texto = texto
+        self.partes = list(_formatter.parse(texto))
+        self.campos = {campo for _, campo, _, _ in self.partes if campo is not None}
+        self.fim_estavel = len(self.partes)
+        for indice, (_, campo, _, _) in enumerate(self.partes):
+            if campo is not None:
+                self.fim_estavel = indice
+                break
+        if self.campos and not self.partes[self.fim_estavel][0].strip():
+            logging.warning(
+                "O template começa com um campo; coloque as instruções fixas antes dos produtos "
+                "e dos dados do cliente para aproveitar o cache de prefixo do provedor."
+            )
+
+    def _renderizar(self, partes, variables):
+        saida = []
+        for literal, campo, especificacao, conversao in partes:
+            saida.append(literal)
+            if campo is None:
+                continue
+            valor, _ = _formatter.get_field(campo, (), variables)
+            valor = _formatter.convert_field(valor, conversao)
+            saida.append(_formatter.format_field(valor, especificacao or ''))
+        return ''.join(saida)
+
+    def render(self, variables):
+        return self._renderizar(self.partes, variables)
+
+    def prefixo_estavel(self, variables):
+        # Texto fixo entre clientes, até o primeiro campo
+        if self.fim_estavel >= len(self.partes):
+            return self.render(variables)
+        literal = self.partes[self.fim_estavel][0]
+        return self._renderizar(self.partes[:self.fim_estavel], variables) + literal
+
+
+@lru_cache(maxsize=8)
+def compilar_template(texto):
+    return PromptTemplate(texto)
+
+
+class OpenAIClientManager:
+    """Mantém um ``AsyncOpenAI`` vivo entre consultas, com as conexões aquecidas.
+
+    O cliente só é recriado quando a chave, a URL base ou os timeouts mudam.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._assinatura = None
+
+    async def get_client(self, config):
+        opcoes = opcoes_openai(config)
+        assinatura = (config.get('api_key'), opcoes["base_url"], opcoes["timeout"], opcoes["connect_timeout"])
+        if self._client is None or assinatura != self._assinatura:
+            await self.close()
+            self._client = AsyncOpenAI(
+                api_key=config.get('api_key'),
+                base_url=opcoes["base_url"] or None,
+                timeout=openai.Timeout(opcoes["timeout"], connect=opcoes["connect_timeout"]),
+                max_retries=0,  # as novas tentativas são feitas em consultar_openai
+            )
+            self._assinatura = assinatura
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+client_manager = OpenAIClientManager()
+
+
+async def fechar_cliente():
+    await client_manager.close()
+
+
+def opcoes_openai(config):
+    opcoes = dict(OPENAI_DEFAULTS)
+    opcoes.update(config.get('openai', {}))
+    return opcoes
+
+
+def espera_retry_after(erro):
+    # Respeita o tempo indicado pelo servidor, em milissegundos, segundos ou data HTTP
+    resposta = getattr(erro, 'response', None)
+    if resposta is None:
+        return None
+    headers = resposta.headers
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        valor = headers.get('retry-after')
+        if not valor:
+            return None
+        try:
+            return float(valor)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class StreamAberto:
+    """Stream da OpenAI cujo primeiro texto já chegou (ou que terminou sem texto)."""
+
+    def __init__(self, model, response, iterador, primeiro, uso):
+        self.model = model
+        self.response = response
+        self.iterador = iterador
+        self.primeiro = primeiro
+        self.uso = uso
+        self.hedge = None
+
+
+async def abrir_stream(client, model, messages, max_tokens, timeout):
+    response = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=1,
+        max_tokens=max_tokens,
+        top_p=1,
+        frequency_penalty=0,
+        presence_penalty=0,
+        stream=True,
+        stream_options={"include_usage": True},
+        timeout=timeout
+    )
+    iterador = response.__aiter__()
+    uso = None
+    try:
+        async for chunk in iterador:
+            if chunk.usage is not None:
+                uso = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                return StreamAberto(model, response, iterador, chunk.choices[0].delta.content, uso)
+    except BaseException:
+        await response.close()
+        raise
+    return StreamAberto(model, response, iterador, '', uso)
+
+
+async def _descartar(tarefa):
+    # Cancela o pedido perdedor e fecha a conexão dele, se já tiver aberto
+    if not tarefa.done():
+        tarefa.cancel()
+    try:
+        stream = await tarefa
+    except (asyncio.CancelledError, Exception):
+        return
+    await stream.response.close()
+
+
+async def abrir_com_hedge(client, model, messages, max_tokens, opcoes):
+    inicio = time.monotonic()
+    principal = asyncio.ensure_future(abrir_stream(client, model, messages, max_tokens, opcoes["timeout"]))
+    if not opcoes["hedge"]:
+        return await principal
+
+    done, _ = await asyncio.wait({principal}, timeout=opcoes["hedge_deadline"])
+    if done:
+        return principal.result()
+
+    # Sem nenhum token dentro do prazo: o primeiro dos dois pedidos a responder vence
+    reserva_model = opcoes["fallback_model"] or model
+    logging.info(f"Sem resposta de {model} em {opcoes['hedge_deadline']}s; disparando pedido para {reserva_model}.")
+    reserva = asyncio.ensure_future(abrir_stream(client, reserva_model, messages, max_tokens, opcoes["timeout"]))
+    hedge_stats["hedged"] += 1
+    modelos = {principal: model, reserva: reserva_model}
+    pendentes = {principal, reserva}
+    vencedor = None
+    erros = {}
+    try:
+        while pendentes and vencedor is None:
+            done, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+            # Se os dois chegarem juntos, o pedido original tem preferência
+            for tarefa in (principal, reserva):
+                if tarefa not in done:
+                    continue
+                if tarefa.exception() is not None:
+                    erros[tarefa] = tarefa.exception()
+                elif vencedor is None:
+                    vencedor = tarefa
+    finally:
+        for tarefa in (principal, reserva):
+            if tarefa is not vencedor and tarefa not in erros:
+                await _descartar(tarefa)
+
+    if vencedor is None:
+        raise erros.get(principal) or erros[reserva]
+
+    perdedor = reserva if vencedor is principal else principal
+    hedge_stats["primary_wins" if vencedor is principal else "fallback_wins"] += 1
+    stream = vencedor.result()
+    stream.hedge = {
+        "winner": modelos[vencedor],
+        "loser": modelos[perdedor],
+        "winner_role": "primary" if vencedor is principal else "fallback",
+        "loser_error": type(erros[perdedor]).__name__ if perdedor in erros else None,
+        "ttft": round(time.monotonic() - inicio, 3),
+    }
+    logging.info(f"Hedge: {stream.hedge}; acumulado: {hedge_stats}.")
+    return stream
+
+
+def hash_prefixo(system_message, prefixo):
+    return hashlib.sha256(f"{system_message}\x00{prefixo}".encode('utf-8')).hexdigest()[:16]
+
+class ConsultaPreparada:
+    """Prompt pronto para envio: mensagens, modelo e produtos que couberam no orçamento."""
+
+    def __init__(self, prompt_template, system_message, model, limites, produtos, prompt, prefixo):
+        self.prompt_template = prompt_template
+        self.system_message = system_message
+        self.model = model
+        self.limites = limites
+        self.produtos = produtos
+        self.prompt = prompt
+        self.prefixo = prefixo
+        self.messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": prompt}
+        ]
+        self.tokens_prompt = token_budget.contar_mensagens(self.messages, model)
+
+    def chave_cache(self, respostas, versao_catalogo):
+        return chave_resposta(
+            respostas, self.prompt_template, self.system_message, self.model, versao_catalogo, self.produtos
+        )
+
+
+def preparar_consulta(produtos, respostas, config):
+    # Get the prompt template from the config
+    prompt_template = config.get('prompts', {}).get('prompt_template', '')
+    if not prompt_template:
+        prompt_template = DEFAULT_PROMPT_TEMPLATE
+    template = compilar_template(prompt_template)
+
+    # Get the system message from config
+    system_message = config.get('prompts', {}).get('system_message', '')
+    if not system_message:
+        system_message = "Você é um especialista em produtos químicos e tratamento de superfícies metálicas."
+
+    model = config.get('model', DEFAULT_MODEL)
+    limites = token_budget.opcoes_tokens(config)
+
     # Prepare variables for formatting
     variables = respostas.copy()
-    variables['produtos'] = produtos_joined
 
     # Construir informações do cliente
     informacoes_cliente = "\n".join(f"- {key.replace('_', ' ').title()}: {value}" for key, value in respostas.items())
     variables['informacoes_cliente'] = informacoes_cliente
 
+    # Os produtos ocupam o que sobra do orçamento depois do restante do prompt
+    variables['produtos'] = ""
+    base = token_budget.contar_mensagens([
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": template.render(variables)}
+    ], model)
+    produtos = token_budget.empacotar_produtos(
+        produtos, limites["prompt_budget"] - base, limites["max_product_tokens"], model
+    )
+    variables['produtos'] = "\n".join(produtos)
+
     # Format the prompt
-    prompt = prompt_template.format(**variables)
+    prompt = template.render(variables)
+    prefixo = hash_prefixo(system_message, template.prefixo_estavel(variables))
+    return ConsultaPreparada(prompt_template, system_message, model, limites, produtos, prompt, prefixo)
 
-    # Get the system message from config
-    system_message = config.get('prompts', {}).get('system_message', '')
-    if not system_message:
-        system_message = "Você é um especialista em produtos químicos e tratamento de superfícies metálicas."
 
-    messages = [
-        {"role": "system", "content": system_message},
-        {"role": "user", "content": prompt}
-    ]
+async def consultar_openai(produtos, respostas, config, callback=None, cache_respostas=None, versao_catalogo=None,
+                           preparada=None):
+    # O prompt pode ter sido montado antes (ver predictive.py)
+    if preparada is None:
+        preparada = preparar_consulta(produtos, respostas, config)
+    model = preparada.model
+    limites = preparada.limites
+    prompt = preparada.prompt
+    prefixo = preparada.prefixo
+    messages = preparada.messages
+    tokens_prompt = preparada.tokens_prompt
+    # Os números da consulta anterior não valem para esta
+    ultimo_uso.clear()
+    ultimo_uso['error'] = True
+
+    # Mesmas respostas, prompt, modelo e catálogo: reaproveita a recomendação
+    chave_cache = None
+    if cache_respostas is not None and cache_respostas.ativo:
+        chave_cache = preparada.chave_cache(respostas, versao_catalogo)
+        resultado = cache_respostas.get(chave_cache)
+        if resultado is not None:
+            logging.info("Recomendação servida do cache de respostas.")
+            ultimo_uso.clear()
+            ultimo_uso.update(prompt=0, completion=0)
+            saida = streaming.criar_coalescer(callback, config)
+            cache_respostas.reproduzir(resultado, saida.add)
+            saida.fechar()
+            return resultado
 
     logging.info("Prompt enviado para OpenAI:")
     logging.info(prompt)
 
-    openai.api_key = config.get('api_key')
-    attempts = 5
-    backoff = 1
+    client = await client_manager.get_client(config)
+    opcoes = opcoes_openai(config)
+    attempts = opcoes["max_attempts"]
 
     for attempt in range(attempts):
+        # Pedaços acumulados em lista e entregues à interface em lotes
+        saida = streaming.criar_coalescer(callback, config)
         try:
-            response = await openai.chat.completions.acreate(
-                model="gpt-4o-mini-2024-07-18",
-                messages=messages,
-                temperature=1,
-                max_tokens=2048,
-                top_p=1,
-                frequency_penalty=0,
-                presence_penalty=0,
-                stream=True
-            )
-
-            resultado = ""
-            async for chunk in response:
-                chunk_message = chunk['choices'][0]['delta'].get('content', '')
-                resultado += chunk_message
-                if callback:
-                    callback(chunk_message)
+            stream = await abrir_com_hedge(client, model, messages, limites["max_completion_tokens"], opcoes)
+            try:
+                saida.add(stream.primeiro)
+                uso = stream.uso
+                async for chunk in stream.iterador:
+                    if chunk.usage is not None:
+                        uso = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    saida.add(chunk.choices[0].delta.content)
+            finally:
+                # Também em erro ou cancelamento, para não deixar a conexão presa
+                await stream.response.close()
+            resultado = saida.fechar()
             logging.info("Consulta à OpenAI realizada com sucesso.")
+            ultimo_uso.clear()
+            ultimo_uso.update(
+                prompt=tokens_prompt,
+                completion=token_budget.contar_tokens(resultado, stream.model),
+                prefix_hash=prefixo,
+                model=stream.model
+            )
+            if stream.hedge is not None:
+                ultimo_uso['hedge'] = stream.hedge
+            if uso is not None:
+                # Números oficiais do provedor, incluindo tokens servidos do cache de prefixo
+                detalhes = getattr(uso, 'prompt_tokens_details', None)
+                ultimo_uso.update(
+                    prompt=uso.prompt_tokens,
+                    completion=uso.completion_tokens,
+                    cached=getattr(detalhes, 'cached_tokens', None) or 0
+                )
+            logging.info(
+                f"Tokens usados: prompt={ultimo_uso['prompt']}, resposta={ultimo_uso['completion']}, "
+                f"em cache={ultimo_uso.get('cached', 0)}, prefixo estável={prefixo}."
+            )
+            # A chave é a do modelo pedido: se o modelo reserva do hedge venceu, a resposta não é guardada
+            if chave_cache is not None and stream.model == preparada.model:
+                cache_respostas.put(chave_cache, resultado)
             return resultado
-        except RateLimitError:
-            logging.warning(f"Limite de taxa atingido. Tentativa {attempt + 1}/{attempts}.")
-            await asyncio.sleep(backoff)
-            backoff *= 2
+        except (RateLimitError, APIConnectionError, InternalServerError) as e:
+            # APIConnectionError inclui os timeouts; InternalServerError, os 5xx
+            if saida.partes:
+                # Parte da resposta já foi exibida: repetir duplicaria o texto
+                saida.fechar()
+                logging.error(f"Streaming da OpenAI interrompido: {e}")
+                return "Desculpe, não foi possível processar sua solicitação no momento."
+            if attempt + 1 >= attempts:
+                logging.error(f"Erro ao consultar a API da OpenAI após {attempts} tentativas: {e}")
+                break
+            espera = espera_retry_after(e)
+            limite = opcoes["retry_after_max"] or opcoes["backoff_max"]
+            if espera is not None and espera > limite:
+                # Esperar tanto travaria a interface; desiste logo
+                logging.error(f"A OpenAI pediu {espera:.0f}s de espera (limite {limite:.0f}s): {e}")
+                break
+            if espera is None:
+                teto = min(opcoes["backoff_max"], opcoes["backoff_base"] * (2 ** attempt))
+                espera = random.uniform(teto / 2, teto)
+            logging.warning(
+                f"Falha temporária na OpenAI ({type(e).__name__}). "
+                f"Tentativa {attempt + 1}/{attempts}, nova tentativa em {espera:.1f}s."
+            )
+            await asyncio.sleep(espera)
         except OpenAIError as e:
+            saida.fechar()
             logging.error(f"Erro ao consultar a API da OpenAI: {e}")
             return "Desculpe, não foi possível processar sua solicitação no momento."
     return "Desculpe, estou enfrentando problemas para processar sua solicitação no momento."
@@ -0,0 +1,87 @@
+# animation.py
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+# Animação de digitação (pode ser sobrescrita em config['animation'])
+ANIMATION_DEFAULTS = {
+    "frame_interval": 16,       # milissegundos entre quadros
+    "target_duration": 2.0,     # segundos máximos para revelar uma mensagem inteira
+    "enabled": True,            # False mostra as mensagens de uma vez
+}
+
+
+class TypingAnimator(QObject):
+    """Revela o texto de um QLabel em pedaços, um pedaço por quadro.
+
+    O tamanho do pedaço é escolhido para que a mensagem inteira termine em
+    ``target_duration``; mensagens curtas mantêm a velocidade pedida em
+    ``typing_interval`` (milissegundos por caractere).
+    """
+
+    frame = pyqtSignal()        # o texto visível avançou
+    finished = pyqtSignal()     # a mensagem atual está completa
+
+    def __init__(self, options=None, parent=None):
+        super().__init__(parent)
+        self.options = dict(ANIMATION_DEFAULTS)
+        if options:
+            self.options.update(options)
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.options["frame_interval"])
+        self.timer.timeout.connect(self._avancar)
+        self.label = None
+        self.texto = ""
+        self.posicao = 0
+        self.passo = 1.0        # caracteres por quadro; pode ser fracionário
+        self.quadro = 0
+
+    @property
+    def ativo(self):
+        return self.label is not None
+
+    def iniciar(self, label, texto, typing_interval=20):
+        self.label = label
+        self.texto = texto
+        self.posicao = 0
+        self.quadro = 0
+        if not self.options["enabled"]:
+            self.passo = float(max(1, len(texto)))
+        else:
+            quadros = max(1, round(self.options["target_duration"] * 1000 / self.options["frame_interval"]))
+            por_intervalo = self.options["frame_interval"] / max(1, typing_interval)
+            # Sem arredondar: a fração que sobra num quadro é revelada nos seguintes
+            self.passo = max(por_intervalo, len(texto) / quadros)
+        # O primeiro quadro sai no próximo ciclo do loop, nunca dentro de quem chamou
+        self.timer.start()
+
+    def _avancar(self):
+        if self.label is None:
+            self.timer.stop()
+            return
+        # Calculado a partir do número de quadros, para o erro de arredondamento não se acumular
+        self.quadro += 1
+        posicao = min(len(self.texto), int(self.quadro * self.passo + 1e-9))
+        if posicao == self.posicao and posicao < len(self.texto):
+            return  # menos de um caractere neste quadro
+        self.posicao = posicao
+        self._mostrar()
+
+    def _mostrar(self):
+        self.label.setText(self.texto[:self.posicao])
+        self.frame.emit()
+        if self.posicao >= len(self.texto):
+            self.timer.stop()
+            self.label = None
+            self.finished.emit()
+
+    def pular(self):
+        # Mostra o restante da mensagem atual imediatamente
+        if self.label is None:
+            return False
+        self.posicao = len(self.texto)
+        self._mostrar()
+        return True
+
+    def parar(self):
+        self.timer.stop()
+        self.label = None
@@ -1,39 +1,431 @@
 # cache.py
 
 import sqlite3
+import asyncio
 import time
+import json
+import zlib
+import hashlib
+import logging
+from collections import OrderedDict
 
 CACHE_DB = 'cache.db'
 CACHE_EXPIRATION = 24 * 3600  # 24 horas
 
-def init_db():
-    conn = sqlite3.connect(CACHE_DB)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cache (
-            key TEXT PRIMARY KEY,
-            data TEXT,
-            timestamp REAL
+# Colunas adicionadas depois da primeira versão do esquema
+MIGRATED_COLUMNS = {
+    'etag': 'TEXT',
+    'last_modified': 'TEXT',
+    'body_hash': 'TEXT',
+    'last_access': 'REAL',
+}
+
+# Ajustes aplicados a cada conexão aberta pelo CacheStore
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-8000',       # ~8 MB de páginas em memória
+    'PRAGMA mmap_size=67108864',     # 64 MB mapeados
+    'PRAGMA busy_timeout=5000',
+)
+
+# Gravações acumuladas antes de um commit automático
+BATCH_SIZE = 50
+
+# Camada em memória e manutenção do banco (podem ser sobrescritas em config['cache'])
+CACHE_DEFAULTS = {
+    "memory_entries": 1024,             # entradas mantidas em memória
+    "memory_ttl": CACHE_EXPIRATION,     # segundos que uma entrada fica em memória
+    "max_rows": 5000,                   # 0 = sem limite de linhas
+    "max_bytes": 64 * 1024 * 1024,      # 0 = sem limite de tamanho
+    "max_age": 7 * CACHE_EXPIRATION,    # entradas mais antigas são removidas
+    "maintenance_interval": 900,        # segundos entre verificações de manutenção
+    "idle_seconds": 120,                # só faz manutenção sem uso recente do cache
+    "stale_while_revalidate": False,    # serve entradas expiradas e atualiza em segundo plano
+    "max_staleness": 3 * CACHE_EXPIRATION,  # idade máxima de uma entrada servida expirada
+}
+
+# Limite de parâmetros por consulta "IN (...)" do SQLite
+LOOKUP_CHUNK = 500
+
+
+# Marca, na memória, chaves que já sabemos não existir no banco
+_AUSENTE = object()
+
+
+def chave_url(url):
+    return hashlib.md5(url.encode()).hexdigest()
+
+
+def serializar(data):
+    texto = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(texto.encode('utf-8'))
+
+
+def desserializar(valor):
+    # Linhas antigas guardavam JSON puro numa coluna TEXT
+    if isinstance(valor, bytes):
+        valor = zlib.decompress(valor).decode('utf-8')
+    return json.loads(valor)
+
+
+class LRUCache:
+    """Dicionário limitado em tamanho cujas entradas expiram após ``ttl`` segundos."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._dados = OrderedDict()
+
+    def get(self, key):
+        item = self._dados.get(key)
+        if item is None:
+            return None
+        valor, inserido = item
+        if time.monotonic() - inserido > self.ttl:
+            del self._dados[key]
+            return None
+        self._dados.move_to_end(key)
+        return valor
+
+    def put(self, key, valor):
+        if self.maxsize <= 0:
+            return
+        self._dados[key] = (valor, time.monotonic())
+        self._dados.move_to_end(key)
+        while len(self._dados) > self.maxsize:
+            self._dados.popitem(last=False)
+
+    def discard(self, key):
+        self._dados.pop(key, None)
+
+    def clear(self):
+        self._dados.clear()
+
+    def __len__(self):
+        return len(self._dados)
+
+
+class CacheStore:
+    """Cache de produtos em SQLite com uma única conexão em modo WAL.
+
+    As gravações ficam numa fila e são confirmadas em lote, num só commit.
+    As leituras passam primeiro por um LRU em memória e só então consultam o
+    SQLite pela chave primária.
+    """
+
+    def __init__(self, path=CACHE_DB, batch_size=BATCH_SIZE, options=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.options = dict(CACHE_DEFAULTS)
+        if options:
+            self.options.update(options)
+        self.memoria = LRUCache(self.options["memory_entries"], self.options["memory_ttl"])
+        self._pendentes = []
+        self._dados_pendentes = {}  # key -> dados ainda não confirmados no banco
+        self._acessos = {}
+        self.ultimo_uso = time.monotonic()
+        self.contadores = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'vacuums': 0}
+        self.conn = sqlite3.connect(path)
+        # Só tem efeito em bancos novos; os antigos são convertidos na manutenção
+        self.conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self._criar_esquema()
+
+    def _criar_esquema(self):
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    data BLOB,
+                    timestamp REAL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body_hash TEXT,
+                    last_access REAL
+                )
+            ''')
+            # Migra bancos criados com versões anteriores do esquema
+            existentes = {row[1] for row in self.conn.execute('PRAGMA table_info(cache)')}
+            for coluna, tipo in MIGRATED_COLUMNS.items():
+                if coluna not in existentes:
+                    self.conn.execute(f'ALTER TABLE cache ADD COLUMN {coluna} {tipo}')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)')
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'catalog_version'").fetchone()
+        self.versao_catalogo = int(row[0]) if row else 0
+
+    def configure(self, options):
+        self.options = dict(CACHE_DEFAULTS)
+        if options:
+            self.options.update(options)
+        self.memoria.maxsize = self.options["memory_entries"]
+        self.memoria.ttl = self.options["memory_ttl"]
+
+    @staticmethod
+    def _entrada(data, timestamp, etag, last_modified, body_hash):
+        return {
+            'data': desserializar(data),
+            'timestamp': timestamp,
+            'etag': etag,
+            'last_modified': last_modified,
+            'body_hash': body_hash,
+        }
+
+    def get(self, key):
+        # Inclui entradas expiradas: seus validadores permitem revalidar a página
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        agora = time.time()
+        self.ultimo_uso = time.monotonic()
+        encontrados = {}
+        faltando = []
+        for key in keys:
+            entrada = self.memoria.get(key)
+            if entrada is None:
+                faltando.append(key)
+            elif entrada is _AUSENTE:
+                self.contadores['misses'] += 1
+            else:
+                self.contadores['memory_hits'] += 1
+                self._acessos[key] = agora
+                encontrados[key] = entrada
+        if not faltando:
+            return encontrados
+
+        self.flush()
+        for inicio in range(0, len(faltando), LOOKUP_CHUNK):
+            lote = faltando[inicio:inicio + LOOKUP_CHUNK]
+            marcadores = ','.join('?' * len(lote))
+            rows = self.conn.execute(
+                f'SELECT key, data, timestamp, etag, last_modified, body_hash FROM cache WHERE key IN ({marcadores})',
+                lote
+            )
+            for key, *colunas in rows:
+                try:
+                    entrada = self._entrada(*colunas)
+                except (TypeError, ValueError, zlib.error):
+                    logging.warning(f"Entrada de cache inválida ignorada: {key}")
+                    continue
+                self.memoria.put(key, entrada)
+                self.contadores['disk_hits'] += 1
+                self._acessos[key] = agora
+                encontrados[key] = entrada
+        for key in faltando:
+            if key not in encontrados:
+                self.contadores['misses'] += 1
+                self.memoria.put(key, _AUSENTE)
+        return encontrados
+
+    def _dados_atuais(self, key):
+        entrada = self.memoria.get(key)
+        if entrada is _AUSENTE:
+            return None
+        if entrada is not None:
+            return entrada['data']
+        # Sem flush: um commit a cada página nova desfaria a gravação em lote
+        if key in self._dados_pendentes:
+            return self._dados_pendentes[key]
+        row = self.conn.execute('SELECT data FROM cache WHERE key = ?', (key,)).fetchone()
+        try:
+            return desserializar(row[0]) if row else None
+        except (TypeError, ValueError, zlib.error):
+            return None
+
+    def salvar(self, key, data, etag=None, last_modified=None, body_hash=None):
+        timestamp = time.time()
+        self.ultimo_uso = time.monotonic()
+        if self._dados_atuais(key) != data:
+            # Os produtos de alguma página mudaram: nova versão do catálogo
+            self.versao_catalogo += 1
+            self._pendentes.append((
+                "REPLACE INTO meta (name, value) VALUES ('catalog_version', ?)",
+                (self.versao_catalogo,)
+            ))
+        self._pendentes.append((
+            'REPLACE INTO cache (key, data, timestamp, etag, last_modified, body_hash, last_access) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, serializar(data), timestamp, etag, last_modified, body_hash, timestamp)
+        ))
+        self._dados_pendentes[key] = data
+        self.memoria.put(key, {
+            'data': data,
+            'timestamp': timestamp,
+            'etag': etag,
+            'last_modified': last_modified,
+            'body_hash': body_hash,
+        })
+        self._talvez_flush()
+
+    def renovar(self, key, etag=None, last_modified=None):
+        # Página confirmada como inalterada: atualiza o horário e, se vierem, os validadores
+        timestamp = time.time()
+        self._pendentes.append((
+            'UPDATE cache SET timestamp = ?, etag = COALESCE(?, etag), '
+            'last_modified = COALESCE(?, last_modified) WHERE key = ?',
+            (timestamp, etag, last_modified, key)
+        ))
+        entrada = self.memoria.get(key)
+        if entrada is not None and entrada is not _AUSENTE:
+            atualizada = dict(entrada, timestamp=timestamp)
+            if etag:
+                atualizada['etag'] = etag
+            if last_modified:
+                atualizada['last_modified'] = last_modified
+            self.memoria.put(key, atualizada)
+        self._talvez_flush()
+
+    def _talvez_flush(self):
+        if len(self._pendentes) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pendentes and not self._acessos:
+            return
+        pendentes, self._pendentes = self._pendentes, []
+        self._dados_pendentes = {}
+        acessos, self._acessos = self._acessos, {}
+        with self.conn:
+            for sql, params in pendentes:
+                self.conn.execute(sql, params)
+            # Horário do último acesso, usado pela remoção LRU
+            self.conn.executemany(
+                'UPDATE cache SET last_access = ? WHERE key = ?',
+                [(horario, key) for key, horario in acessos.items()]
+            )
+
+    def registrar_manutencao(self, removidas, compactou):
+        for key in removidas:
+            self.memoria.discard(key)
+        self.contadores['evictions'] += len(removidas)
+        if compactou:
+            self.contadores['vacuums'] += 1
+
+    def estatisticas(self):
+        consultas = self.contadores['memory_hits'] + self.contadores['disk_hits'] + self.contadores['misses']
+        acertos = self.contadores['memory_hits'] + self.contadores['disk_hits']
+        page_count = self.conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = self.conn.execute('PRAGMA page_size').fetchone()[0]
+        return dict(
+            self.contadores,
+            hit_rate=acertos / consultas if consultas else 0.0,
+            rows=self.conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0],
+            bytes=page_count * page_size,
+            memory_entries=len(self.memoria),
         )
-    ''')
-    conn.commit()
-    conn.close()
-
-def carregar_cache():
-    init_db()
-    conn = sqlite3.connect(CACHE_DB)
-    cursor = conn.cursor()
-    current_time = time.time()
-    cursor.execute('SELECT key, data, timestamp FROM cache WHERE timestamp > ?', (current_time - CACHE_EXPIRATION,))
-    rows = cursor.fetchall()
-    cache = {key: {'data': data, 'timestamp': timestamp} for key, data, timestamp in rows}
-    conn.close()
-    return cache
-
-def salvar_cache(key, data):
-    conn = sqlite3.connect(CACHE_DB)
-    cursor = conn.cursor()
-    timestamp = time.time()
-    cursor.execute('REPLACE INTO cache (key, data, timestamp) VALUES (?, ?, ?)', (key, data, timestamp))
-    conn.commit()
-    conn.close()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def executar_manutencao(path, options, agora=None):
+    """Remove entradas velhas ou excedentes e devolve o espaço ao sistema.
+
+    Usa uma conexão própria para poder rodar fora da thread da interface.
+    Retorna as chaves removidas e se o arquivo foi compactado.
+    """
+    agora = time.time() if agora is None else agora
+    removidas = []
+    compactou = False
+    conn = sqlite3.connect(path)
+    try:
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        with conn:
+            # TTL: entradas que nem a revalidação vai mais aproveitar
+            limite = agora - options["max_age"]
+            velhas = [key for (key,) in conn.execute('SELECT key FROM cache WHERE timestamp < ?', (limite,))]
+            conn.execute('DELETE FROM cache WHERE timestamp < ?', (limite,))
+            removidas.extend(velhas)
+
+            # LRU: as menos acessadas primeiro
+            candidatas = conn.execute(
+                'SELECT key, length(data) + length(key) FROM cache '
+                'ORDER BY COALESCE(last_access, timestamp)'
+            ).fetchall()
+            linhas = len(candidatas)
+            usados = sum(tamanho or 0 for _, tamanho in candidatas)
+            excedentes = []
+            for key, tamanho in candidatas:
+                sobra_linhas = options["max_rows"] and linhas > options["max_rows"]
+                sobra_bytes = options["max_bytes"] and usados > options["max_bytes"]
+                if not (sobra_linhas or sobra_bytes):
+                    break
+                excedentes.append(key)
+                linhas -= 1
+                usados -= tamanho or 0
+            conn.executemany('DELETE FROM cache WHERE key = ?', [(key,) for key in excedentes])
+            removidas.extend(excedentes)
+
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # Banco antigo: converte uma vez para vácuo incremental
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+            compactou = True
+        elif conn.execute('PRAGMA freelist_count').fetchone()[0]:
+            conn.execute('PRAGMA incremental_vacuum')
+            compactou = True
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    return removidas, compactou
+
+
+async def manutencao_periodica():
+    # Roda em segundo plano enquanto a aplicação estiver aberta
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(get_store().options["maintenance_interval"])
+        store = get_store()
+        if time.monotonic() - store.ultimo_uso < store.options["idle_seconds"]:
+            continue
+        store.flush()
+        try:
+            removidas, compactou = await loop.run_in_executor(
+                None, executar_manutencao, store.path, dict(store.options)
+            )
+        except sqlite3.Error as e:
+            logging.error(f"Erro na manutenção do cache: {e}")
+            continue
+        store.registrar_manutencao(removidas, compactou)
+        logging.info(f"Manutenção do cache concluída: {store.estatisticas()}")
+
+
+_store = None
+_opcoes = {}
+
+
+def configurar_cache(config):
+    _opcoes.clear()
+    _opcoes.update(config.get('cache', {}))
+    if _store is not None:
+        _store.configure(_opcoes)
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = CacheStore(options=_opcoes)
+    return _store
+
+
+def fechar_store():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
+
+
+def expirado(entrada, agora=None):
+    agora = time.time() if agora is None else agora
+    return entrada['timestamp'] <= agora - CACHE_EXPIRATION
+
+def pode_servir_expirado(entrada, options, agora=None):
+    # Stale-while-revalidate: aceita a entrada vencida até o limite de idade
+    if not options.get("stale_while_revalidate"):
+        return False
+    agora = time.time() if agora is None else agora
+    return agora - entrada['timestamp'] <= options["max_staleness"]
@@ -23,6 +23,8 @@ def load_config():
     config.setdefault('api_key', "")
     config.setdefault('site_link', "")
     config.setdefault('urls_file', "")
+    config.setdefault('network', {})
+    config.setdefault('crawl', {})
 
     return config
 
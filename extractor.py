@@ -0,0 +1,414 @@
+# extractor.py
+
+import asyncio
+import codecs
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # lxml é opcional
+    etree = None
+
+try:
+    import charset_normalizer
+except ImportError:  # instalado junto com o requests, mas opcional
+    charset_normalizer = None
+
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+# Seletores padrão (podem ser sobrescritos em config['selectors'])
+SELECTORS_DEFAULTS = {
+    "title": {"tag": "h1", "class": "c-dark title-big mb-0"},
+    "description": {"tag": "article", "class": "product-text"},
+}
+
+# Elementos sem tag de fechamento: nunca entram na pilha de abertos
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+    'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr',
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer',
+])
+
+# Conteúdo que o get_text() do BeautifulSoup não inclui
+IGNORED_CONTAINERS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+# Páginas sem charset no Content-Type: bytes lidos antes de detectar a codificação
+AMOSTRA_CHARSET = 64 * 1024
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_:.-]+)', re.IGNORECASE)
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Onde o HTML é analisado (config['parser_pool']):
+#   "process" - processos separados, a interface nunca espera o parser
+#   "thread"  - threads, útil com o backend lxml, que libera o GIL
+#   "inline"  - no próprio loop, analisando enquanto a resposta chega
+PARSER_POOL_DEFAULTS = {
+    "mode": "process",
+    "workers": 0,  # 0 = de acordo com o número de núcleos
+}
+
+_opcoes = {"selectors": SELECTORS_DEFAULTS, "backend": "html.parser"}
+
+
+def configurar_extracao(config):
+    selectors = dict(SELECTORS_DEFAULTS)
+    selectors.update(config.get('selectors', {}))
+    _opcoes["selectors"] = selectors
+    _opcoes["backend"] = config.get('parser_backend', 'html.parser')
+    parser_pool.configure(config.get('parser_pool', {}))
+
+
+def detectar_charset(amostra):
+    # Mesma ordem do UnicodeDammit do BeautifulSoup: BOM, <meta charset> e detector estatístico
+    for bom, nome in BOMS:
+        if amostra.startswith(bom):
+            return nome
+    declarado = META_CHARSET.search(amostra)
+    if declarado:
+        nome = declarado.group(1).decode('ascii')
+        try:
+            codecs.lookup(nome)
+            return nome
+        except LookupError:
+            pass
+    encoding = None
+    if charset_normalizer is not None:
+        resultados = charset_normalizer.from_bytes(amostra)
+        melhor = resultados.best()
+        if melhor is not None:
+            encoding = melhor.encoding
+            # Em texto curto várias codificações ocidentais empatam; como os
+            # navegadores, fica com a windows-1252 quando ela está entre elas
+            for resultado in resultados:
+                if ((resultado.chaos, resultado.coherence) == (melhor.chaos, melhor.coherence)
+                        and 'cp1252' in resultado.could_be_from_charset):
+                    encoding = 'cp1252'
+                    break
+    elif chardet is not None:
+        encoding = chardet.detect(amostra)['encoding']
+    try:
+        # Uma amostra só com ASCII não diz nada sobre o resto da página
+        if encoding and codecs.lookup(encoding).name != 'ascii':
+            return encoding
+    except LookupError:
+        pass
+    return 'utf-8'
+
+
+class DecoderDetectado:
+    """Decoder incremental para páginas sem charset conhecido.
+
+    Guarda o começo do corpo até ``AMOSTRA_CHARSET`` bytes (ou o fim da
+    página), detecta a codificação e daí em diante decodifica normalmente.
+    """
+
+    def __init__(self):
+        self.amostra = []
+        self.tamanho = 0
+        self.decoder = None
+
+    def decode(self, dados, final=False):
+        if self.decoder is None:
+            self.amostra.append(dados)
+            self.tamanho += len(dados)
+            if self.tamanho < AMOSTRA_CHARSET and not final:
+                return ''
+            dados = b''.join(self.amostra)
+            self.amostra = []
+            self.decoder = codecs.getincrementaldecoder(detectar_charset(dados))(errors='replace')
+        return self.decoder.decode(dados, final)
+
+
+def criar_decoder(charset):
+    if not charset:
+        return DecoderDetectado()
+    try:
+        return codecs.getincrementaldecoder(charset)(errors='replace')
+    except LookupError:
+        logging.warning(f"Codificação desconhecida '{charset}', detectando pelo conteúdo.")
+        return DecoderDetectado()
+
+
+def classe_corresponde(valor, alvo):
+    # Mesma regra do find_all(class_=...): uma das classes ou o atributo inteiro
+    if not alvo:
+        return True
+    if valor is None:
+        return False
+    classes = valor.split()
+    return alvo in classes or ' '.join(classes) == alvo
+
+
+class _Captura:
+    __slots__ = ('partes',)
+
+    def __init__(self):
+        self.partes = []
+
+    def texto(self):
+        return ''.join(self.partes)
+
+
+class ProductExtractor(HTMLParser):
+    """Extrai título e descrição dos produtos à medida que o HTML chega.
+
+    Só os textos dentro dos elementos selecionados são guardados; o resto da
+    página é descartado assim que é lido. O resultado é idêntico ao de
+    ``BeautifulSoup(html, 'html.parser')`` seguido de ``get_text(strip=True)``.
+    """
+
+    def __init__(self, selectors=None):
+        super().__init__(convert_charrefs=True)
+        self.selectors = selectors or _opcoes["selectors"]
+        self.campos = {campo: [] for campo in self.selectors}
+        # Pilha dos elementos abertos: (nome, capturas iniciadas nele, ignora texto)
+        self._pilha = []
+        self._ativas = []
+        self._ignorando = 0
+        self._texto_pendente = []
+
+    def _casa(self, tag, attrs):
+        encontrados = []
+        for campo, seletor in self.selectors.items():
+            if seletor.get("tag") == tag and classe_corresponde(dict(attrs).get("class"), seletor.get("class")):
+                encontrados.append(campo)
+        return encontrados
+
+    def _descarregar_texto(self):
+        # Cada trecho de texto entre duas tags é uma string do BeautifulSoup
+        if not self._texto_pendente:
+            return
+        texto = ''.join(self._texto_pendente).strip()
+        self._texto_pendente = []
+        if texto and self._ativas and not self._ignorando:
+            for captura in self._ativas:
+                captura.partes.append(texto)
+
+    def handle_starttag(self, tag, attrs):
+        self._descarregar_texto()
+        capturas = []
+        for campo in self._casa(tag, attrs):
+            captura = _Captura()
+            self.campos[campo].append(captura)
+            capturas.append(captura)
+        if tag in VOID_ELEMENTS:
+            return
+        ignora = tag in IGNORED_CONTAINERS
+        self._pilha.append((tag, capturas, ignora))
+        self._ativas.extend(capturas)
+        if ignora:
+            self._ignorando += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._descarregar_texto()
+        if tag in VOID_ELEMENTS:
+            return
+        # Fecha o elemento aberto mais recente com esse nome e tudo acima dele
+        for posicao in range(len(self._pilha) - 1, -1, -1):
+            if self._pilha[posicao][0] == tag:
+                break
+        else:
+            return
+        while len(self._pilha) > posicao:
+            _, capturas, ignora = self._pilha.pop()
+            for captura in capturas:
+                self._ativas.remove(captura)
+            if ignora:
+                self._ignorando -= 1
+
+    def handle_data(self, data):
+        self._texto_pendente.append(data)
+
+    def handle_comment(self, data):
+        self._descarregar_texto()
+
+    def handle_decl(self, decl):
+        self._descarregar_texto()
+
+    def handle_pi(self, data):
+        self._descarregar_texto()
+
+    def unknown_decl(self, data):
+        self._descarregar_texto()
+        if data.upper().startswith('CDATA['):
+            self._texto_pendente.append(data[len('CDATA['):])
+            self._descarregar_texto()
+
+    def close(self):
+        super().close()
+        self._descarregar_texto()
+        return self.produtos()
+
+    def produtos(self):
+        titulos = self.campos.get("title", [])
+        descricoes = self.campos.get("description", [])
+        return [f"{titulo.texto()}: {descricao.texto()}" for titulo, descricao in zip(titulos, descricoes)]
+
+
+class LxmlProductExtractor:
+    """Variante mais rápida baseada no ``HTMLPullParser`` do lxml.
+
+    O libxml2 corrige HTML malformado de forma diferente do ``html.parser``;
+    em páginas bem formadas o resultado é o mesmo.
+    """
+
+    def __init__(self, selectors=None):
+        self.selectors = selectors or _opcoes["selectors"]
+        self.campos = {campo: [] for campo in self.selectors}
+        self._parser = etree.HTMLPullParser(events=('start', 'end'))
+        self._elementos = {}
+
+    def _casa(self, elemento):
+        encontrados = []
+        for campo, seletor in self.selectors.items():
+            if seletor.get("tag") == elemento.tag and classe_corresponde(elemento.get("class"), seletor.get("class")):
+                encontrados.append(campo)
+        return encontrados
+
+    def _textos(self, elemento, partes, ignorando=False):
+        ignorando = ignorando or elemento.tag in IGNORED_CONTAINERS
+        if elemento.text and not ignorando:
+            partes.append(elemento.text)
+        for filho in elemento:
+            if isinstance(filho.tag, str):
+                self._textos(filho, partes, ignorando)
+            if filho.tail and not ignorando:
+                partes.append(filho.tail)
+
+    def _processar_eventos(self):
+        for evento, elemento in self._parser.read_events():
+            if not isinstance(elemento.tag, str):
+                continue
+            if evento == 'start':
+                for campo in self._casa(elemento):
+                    captura = _Captura()
+                    self.campos[campo].append(captura)
+                    self._elementos.setdefault(elemento, []).append(captura)
+            elif elemento in self._elementos:
+                partes = []
+                self._textos(elemento, partes)
+                texto = [parte.strip() for parte in partes]
+                for captura in self._elementos.pop(elemento):
+                    captura.partes = [parte for parte in texto if parte]
+            if evento == 'end' and not self._elementos:
+                # Fora de qualquer captura: libera a árvore já lida
+                elemento.clear(keep_tail=True)
+                while elemento.getprevious() is not None:
+                    del elemento.getparent()[0]
+
+    def feed(self, data):
+        if not data:
+            return  # ex.: o decoder ainda está juntando a amostra para detectar o charset
+        self._parser.feed(data)
+        self._processar_eventos()
+
+    def close(self):
+        self._parser.close()
+        self._processar_eventos()
+        return self.produtos()
+
+    def produtos(self):
+        titulos = self.campos.get("title", [])
+        descricoes = self.campos.get("description", [])
+        return [f"{titulo.texto()}: {descricao.texto()}" for titulo, descricao in zip(titulos, descricoes)]
+
+
+def criar_extrator(backend=None, selectors=None):
+    backend = backend or _opcoes["backend"]
+    if backend in ('lxml', 'auto') and etree is not None:
+        return LxmlProductExtractor(selectors)
+    if backend == 'lxml':
+        logging.warning("lxml não está instalado; usando html.parser.")
+    return ProductExtractor(selectors)
+
+
+def extrair_produtos(html, backend=None, selectors=None):
+    extrator = criar_extrator(backend, selectors)
+    extrator.feed(html)
+    return extrator.close()
+
+
+def extrair_produtos_bytes(corpo, charset, backend=None, selectors=None):
+    # Executado nos workers: recebe o corpo cru e devolve só a lista de produtos
+    html = criar_decoder(charset).decode(corpo, final=True)
+    return extrair_produtos(html, backend, selectors)
+
+
+class ParserPool:
+    """Executor criado sob demanda onde as páginas baixadas são analisadas."""
+
+    def __init__(self, options=None):
+        self.options = dict(PARSER_POOL_DEFAULTS)
+        if options:
+            self.options.update(options)
+        self._executor = None
+
+    def configure(self, options):
+        novas = dict(PARSER_POOL_DEFAULTS)
+        novas.update(options or {})
+        if novas != self.options:
+            self.shutdown()
+            self.options = novas
+
+    @property
+    def ativo(self):
+        return self.options["mode"] in ("process", "thread")
+
+    def _workers(self):
+        workers = self.options["workers"]
+        if not workers or workers <= 0:
+            workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+        return workers
+
+    def _get_executor(self):
+        if self._executor is None:
+            workers = self._workers()
+            if self.options["mode"] == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parser")
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=workers)
+            logging.info(f"Pool de análise de HTML iniciado ({self.options['mode']}, {workers} workers).")
+        return self._executor
+
+    async def extrair(self, corpo, charset):
+        loop = asyncio.get_running_loop()
+        args = (corpo, charset, _opcoes["backend"], _opcoes["selectors"])
+        try:
+            return await loop.run_in_executor(self._get_executor(), extrair_produtos_bytes, *args)
+        except BrokenProcessPool:
+            # Um worker morreu: recria o pool na próxima página e analisa esta aqui mesmo
+            logging.error("Pool de análise de HTML interrompido; recriando.")
+            self.shutdown()
+            return extrair_produtos_bytes(*args)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logging.info("Pool de análise de HTML encerrado.")
+
+
+parser_pool = ParserPool()
+
+
+def encerrar_pool():
+    parser_pool.shutdown()
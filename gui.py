@@ -2,23 +2,30 @@
 
 import sys
 import os
-import unicodedata
 import logging
 import asyncio
 import requests
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QTextEdit, QPushButton,
-    QHBoxLayout, QLabel, QSizePolicy, QScrollArea,
-    QMenuBar, QMenu, QFileDialog, QMessageBox, QDialog, QFrame
+    QApplication, QWidget, QVBoxLayout, QTextEdit, QPushButton,
+    QHBoxLayout, QLabel, QSizePolicy, QMenuBar, QMenu, QFileDialog, QMessageBox, QDialog
 )
-from PyQt6.QtCore import Qt, QSize, QTimer, pyqtSignal
-from PyQt6.QtGui import QFont, QIcon, QKeySequence, QFontDatabase, QPixmap, QAction, QColor
+from PyQt6.QtCore import Qt, QSize, QTimer, QEvent, pyqtSignal
+from PyQt6.QtGui import QFont, QIcon, QKeySequence, QFontDatabase, QPixmap, QAction
 
 from config import load_config
 from settings_window import SettingsWindow
 import network
+import extractor
+import scheduler
+import retrieval
 import cache as cache_module
 import ai
+import response_cache
+import predictive
+import animation
+import scrolling
+import transcript
+import themes
 
 import qasync
 
@@ -46,8 +53,6 @@ class ChatGPTWindow(QWidget):
         # Carrega a fonte personalizada
         self.load_custom_font()
 
-        self.message_labels = []
-
         # Carrega as configurações
         self.config = load_config()
         self.questions = self.config.get('questions', [])
@@ -56,6 +61,12 @@ class ChatGPTWindow(QWidget):
         self.site_link = self.config.get('site_link', '')
         self.urls_file = self.config.get('urls_file', 'urls.txt')
         self.option_button_color = self.config.get('option_button_color', '#2B4FFF')
+        network.configurar_rede(self.config)
+        extractor.configurar_extracao(self.config)
+        cache_module.configurar_cache(self.config)
+        self.retriever = retrieval.criar_retriever(self.config)
+        self.cache_respostas = response_cache.criar_cache_respostas(cache_module.get_store().conn, self.config)
+        self.preditor = predictive.criar_preditor(cache_module.get_store().conn, self.config)
 
         # Configurações da janela principal
         self.setWindowTitle("Lynx")
@@ -97,7 +108,7 @@ class ChatGPTWindow(QWidget):
         # Botão para alternar tema
         self.theme_toggle_button = QPushButton()
         self.theme_toggle_button.setFixedSize(30, 30)
-        self.theme_toggle_button.setStyleSheet("border: none; margin-right: 10px;")
+        self.theme_toggle_button.setObjectName("themeToggle")
         self.theme_toggle_button.setCursor(Qt.CursorShape.PointingHandCursor)
         self.theme_toggle_button.clicked.connect(self.toggle_theme)
         self.update_theme_icon()
@@ -105,55 +116,20 @@ class ChatGPTWindow(QWidget):
         # Adicionar o botão ao menu bar
         self.menu_bar.setCornerWidget(self.theme_toggle_button, Qt.Corner.TopRightCorner)
 
-        # Área de rolagem para as mensagens
-        self.scroll_area = QScrollArea(self)
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setFrameShape(QFrame.Shape.NoFrame)  # Remove a moldura
-        self.scroll_area.setStyleSheet("""
-            QScrollArea {
-                background: transparent;
-                border: none; /* Remove qualquer borda */
-            }
-            QScrollBar:vertical {
-                width: 0px;
-            }
-            QScrollBar:horizontal {
-                height: 0px;
-            }
-        """)
-        self.scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-
-        # Widget que contém o display de mensagens
-        self.chat_display_widget = QWidget(self)
-        self.chat_display = QVBoxLayout(self.chat_display_widget)
-        self.chat_display.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.chat_display.setSpacing(10)
-        self.chat_display_widget.setLayout(self.chat_display)
-        self.chat_display_widget.setStyleSheet("background-color: transparent; padding: 10px;")
-        self.chat_display_widget.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
-        self.scroll_area.setWidget(self.chat_display_widget)
+        # Histórico da conversa: modelo de mensagens desenhado por um delegate
+        self.transcript = transcript.TranscriptView(self)
+        self.transcript.setObjectName("transcript")
+        self.transcript.optionSelected.connect(self.option_selected)
+        self.transcript_model = self.transcript.transcript_model
+        self.apply_transcript_colors()
+
+        # No máximo uma rolagem automática por quadro, pausada se o usuário subir
+        self.rolagem = scrolling.ScrollScheduler(self.transcript, self.config.get('scrolling', {}), self)
 
         # Campo de entrada de texto
         self.text_input = CustomTextEdit(self)
         self.text_input.setPlaceholderText("Digite sua mensagem aqui...")
-        self.text_input.setStyleSheet("""
-            QTextEdit { 
-                background-color: #2f2f2f;
-                color: white;
-                border-radius: 20px; 
-                padding: 10px 20px;  
-                font-size: 14px;
-                border: none;
-                font-family: 'Inter';
-            }
-            QTextEdit::vertical-scrollbar {
-                width: 0px;
-            }
-            QTextEdit::horizontal-scrollbar {
-                height: 0px;
-            }
-        """)
+        self.text_input.setObjectName("messageInput")
         self.text_input.setFont(QFont("Inter", 12))
         self.text_input.setFixedHeight(50)
         self.text_input.textChanged.connect(self.adjust_text_input_height)
@@ -168,24 +144,7 @@ class ChatGPTWindow(QWidget):
         else:
             self.send_button.setText("Enviar")
         self.send_button.setFixedSize(QSize(80, 40))
-        self.send_button.setStyleSheet("""
-            QPushButton { 
-                background-color: #ffffff; 
-                border: none; 
-                border-radius: 20px; 
-                color: black;
-                font-family: 'Inter';
-            }
-            QPushButton:hover {
-                background-color: #c1c1c1;
-            }
-            QPushButton:pressed {
-                background-color: #b5b5b5;
-            }
-            QPushButton:disabled {
-                background-color: #555555;
-            }
-        """)
+        self.send_button.setProperty("role", "send")
         self.send_button.setCursor(Qt.CursorShape.PointingHandCursor)
         self.send_button.clicked.connect(self.send_message)
 
@@ -198,24 +157,7 @@ class ChatGPTWindow(QWidget):
         else:
             self.clear_button.setText("Limpar")
         self.clear_button.setFixedSize(QSize(80, 40))
-        self.clear_button.setStyleSheet("""
-            QPushButton { 
-                background-color: #FF4F4F; 
-                border: none; 
-                border-radius: 20px; 
-                color: white;
-                font-family: 'Inter';
-            }
-            QPushButton:hover {
-                background-color: #D13A3A;
-            }
-            QPushButton:pressed {
-                background-color: #A32929;
-            }
-            QPushButton:disabled {
-                background-color: #555555;
-            }
-        """)
+        self.clear_button.setProperty("role", "clear")
         self.clear_button.setCursor(Qt.CursorShape.PointingHandCursor)
         self.clear_button.clicked.connect(self.clear_conversation)
 
@@ -233,29 +175,26 @@ class ChatGPTWindow(QWidget):
         input_layout.addWidget(self.text_input_container)
 
         # Adiciona o scroll de mensagens e o input layout ao layout principal
-        self.layout.addWidget(self.scroll_area, 1)
+        self.layout.addWidget(self.transcript, 1)
         self.layout.addLayout(input_layout)
 
-        # Timer para animação de escrita
-        self.typing_timer = QTimer()
-        self.typing_timer.timeout.connect(self.display_next_character)
+        # Animação de escrita: pedaços por quadro, com duração limitada
+        self.animador = animation.TypingAnimator(self.config.get('animation', {}), self)
+        self.animador.frame.connect(self.scroll_to_bottom)
+        self.animador.finished.connect(self.display_next_message)
         self.current_message = ""
-        self.displayed_text = ""
         self.is_displaying = False
         self.is_user_message = False
 
-        # Lista para manter referências aos QLabel e evitar coleta de lixo
-        self.message_labels = []
-
-        # Fonte personalizada para mensagens
-        self.message_font = QFont("Inter", 12)
-        self.user_message_font = QFont("Inter", 12)
-        self.options_user = QFont("Inter", 10)
-
         # Estado da conversa
         self.conversa_ativa = False
         self.respostas_coletadas = {}
         self.current_question_index = 0
+        # Carregamento antecipado do catálogo (ver iniciar_aquecimento)
+        self.aquecimento = None
+        self.aguardando_catalogo = False
+        self.ultimo_progresso = None
+        self.previsao = None
 
         # Inicializa a fila de mensagens
         self.message_queue = []
@@ -282,15 +221,24 @@ class ChatGPTWindow(QWidget):
                 print(f"Arquivo de fonte não encontrado: {font_path}")
 
     def apply_theme(self):
-        if self.current_theme == 'dark':
-            self.setStyleSheet(self.get_dark_theme_stylesheet())
-        else:
-            self.setStyleSheet(self.get_light_theme_stylesheet())
-        
-        # Atualizar o estilo das mensagens existentes
-        for label in self.message_labels:
-            is_user = label.property('is_user')
-            label.setStyleSheet(self.get_message_style(is_user))
+        # Uma folha de estilos para a aplicação inteira, analisada uma vez;
+        # o tema é escolhido pela propriedade dinâmica "theme" da janela
+        app = QApplication.instance()
+        folha = themes.compilar_stylesheet()
+        if app.styleSheet() != folha:
+            app.setStyleSheet(folha)
+        self.setProperty('theme', self.current_theme)
+        for widget in [self] + self.findChildren(QWidget):
+            widget.style().unpolish(widget)
+            widget.style().polish(widget)
+
+        # As mensagens são desenhadas pelo delegate; basta trocar as cores e redesenhar
+        if hasattr(self, 'transcript'):
+            self.apply_transcript_colors()
+            self.transcript.viewport().update()
+
+    def apply_transcript_colors(self):
+        self.transcript.delegate.definir_cores(themes.cores_mensagens(self.current_theme, self.option_button_color))
 
     def toggle_theme(self):
         if self.current_theme == 'dark':
@@ -312,48 +260,6 @@ class ChatGPTWindow(QWidget):
         else:
             self.theme_toggle_button.setText("Tema")
 
-    def get_dark_theme_stylesheet(self):
-        return """
-            QWidget {
-                background-color: #1e1e1e;
-                color: white;
-                font-family: 'Inter';
-            }
-            QLabel {
-                color: white;
-                font-family: 'Inter';
-            }
-            QPushButton {
-                color: white;
-                font-family: 'Inter';
-            }
-            QTextEdit {
-                color: white;
-                font-family: 'Inter';
-            }
-        """
-
-    def get_light_theme_stylesheet(self):
-        return """
-            QWidget {
-                background-color: #f0f0f0;
-                color: black;
-                font-family: 'Inter';
-            }
-            QLabel {
-                color: black;
-                font-family: 'Inter';
-            }
-            QPushButton {
-                color: black;
-                font-family: 'Inter';
-            }
-            QTextEdit {
-                color: black;
-                font-family: 'Inter';
-            }
-        """
-
     def setup_shortcuts(self):
         # Atalho para enviar mensagem (Ctrl+Enter)
         send_shortcut = QAction(self)
@@ -361,6 +267,10 @@ class ChatGPTWindow(QWidget):
         send_shortcut.triggered.connect(self.send_message)
         self.addAction(send_shortcut)
 
+        # Clique nas mensagens ou tecla no campo de texto pulam a animação
+        self.transcript.viewport().installEventFilter(self)
+        self.text_input.installEventFilter(self)
+
         # Atalho para limpar conversa (Ctrl+L)
         clear_shortcut = QAction(self)
         clear_shortcut.setShortcut(QKeySequence("Ctrl+L"))
@@ -385,139 +295,52 @@ class ChatGPTWindow(QWidget):
             return
 
         self.current_message = message
-        self.displayed_text = ""
         self.is_user_message = is_user
         self.is_displaying = True
 
-        # Container de mensagem
-        self.message_container = QHBoxLayout()
-        self.message_container.setSizeConstraint(QHBoxLayout.SizeConstraint.SetMinimumSize)
-
-        # Widget da mensagem
-        self.message_widget = QWidget()
-        self.message_layout = QVBoxLayout()
-        self.message_layout.setContentsMargins(10, 10, 10, 10)
-        self.message_widget.setLayout(self.message_layout)
-
-        # QLabel para a mensagem
-        self.message_label = QLabel("")
-        self.message_label.setWordWrap(True)
-        self.message_label.setFont(self.user_message_font if is_user else self.message_font)
-        self.message_label.setProperty('is_user', is_user)
-        self.message_label.setStyleSheet(self.get_message_style(is_user))
-
-        if is_user:
-            max_width = int(self.width() * 0.7)
-            self.message_label.setMaximumWidth(max_width)
-            self.message_container.setAlignment(Qt.AlignmentFlag.AlignRight)
-        else:
-            self.message_label.setMaximumWidth(self.width())
-            self.message_container.setAlignment(Qt.AlignmentFlag.AlignLeft)
-
-        self.message_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
-        self.message_layout.addWidget(self.message_label)
-
-        # Botões de opções, se houver
-        if not is_user and options:
-            buttons_layout = QHBoxLayout()
-            buttons_layout.setSpacing(10)
-            for option in options:
-                button = QPushButton(option)
-                button.setFont(self.options_user)
-                button.setStyleSheet(f"""
-                    QPushButton {{
-                        background-color: {self.option_button_color};
-                        color: white;
-                        border: none;
-                        border-radius: 10px;
-                        padding: 8px 12px;
-                        font-family: 'Inter';
-                    }}
-                    QPushButton:hover {{
-                        background-color: {self.darken_color(self.option_button_color, 20)};
-                    }}
-                    QPushButton:pressed {{
-                        background-color: {self.darken_color(self.option_button_color, 40)};
-                    }}
-                """)
-                button.setCursor(Qt.CursorShape.PointingHandCursor)
-                button.clicked.connect(lambda checked, opt=option: self.option_selected(opt))
-                buttons_layout.addWidget(button)
-            self.message_layout.addLayout(buttons_layout)
-
-        # Adicionar o widget da mensagem ao container
-        self.message_container.addWidget(self.message_widget)
-
-        # Adicionar o container de mensagem ao layout principal de chat
-        self.chat_display.addLayout(self.message_container)
-
-        # Manter referência ao QLabel para evitar coleta de lixo
-        self.message_labels.append(self.message_label)
+        # Nova linha no modelo; as opções são desenhadas e clicadas dentro dela
+        self.message_label = self.transcript_model.adicionar("", is_user, None if is_user else options)
 
         # Iniciar a animação de digitação
-        self.typing_index = 0
-        self.typing_timer.start(typing_interval)
+        self.animador.iniciar(self.message_label, message, typing_interval)
 
-        # Rolagem automática para o final
-        self.scroll_to_bottom()
+        # Rolagem automática para o final; a mensagem do próprio usuário sempre leva ao fim
+        self.scroll_to_bottom(forcar=is_user)
 
     def darken_color(self, color_hex, amount):
-        color = QColor(color_hex)
-        h, s, v, a = color.getHsv()
-        v = max(0, v - amount)
-        color.setHsv(h, s, v, a)
-        return color.name()
-
-    def display_next_character(self):
-        if self.typing_index < len(self.current_message):
-            self.displayed_text += self.current_message[self.typing_index]
-            if self.message_label:
-                self.message_label.setText(self.displayed_text)
-            self.typing_index += 1
-            self.scroll_to_bottom()
+        return themes.darken_color(color_hex, amount)
+
+    def display_next_message(self):
+        self.is_displaying = False
+
+        # Verifica se há mensagens na fila
+        if self.message_queue:
+            next_message, is_user, options, typing_interval = self.message_queue.pop(0)
+            self.add_message(next_message, is_user, options, typing_interval)
         else:
-            self.typing_timer.stop()
-            self.is_displaying = False
+            self.message_label = None  # Resetar a referência
 
-            # Verifica se há mensagens na fila
-            if self.message_queue:
-                next_message, is_user, options, typing_interval = self.message_queue.pop(0)
-                self.add_message(next_message, is_user, options, typing_interval)
-            else:
-                self.message_label = None  # Resetar a referência
+    def skip_typing(self):
+        # Clique ou tecla durante a animação: mostra a mensagem atual e as da fila de uma vez
+        if not self.is_displaying:
+            return
+        self.transcript.setUpdatesEnabled(False)
+        try:
+            while self.is_displaying and self.animador.pular():
+                pass
+        finally:
+            self.transcript.setUpdatesEnabled(True)
+        self.scroll_to_bottom()
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.Type.MouseButtonPress, QEvent.Type.KeyPress) and self.is_displaying:
+            self.skip_typing()
+        return super().eventFilter(obj, event)
 
     def option_selected(self, option):
         self.add_message(option, is_user=True)
         self.process_user_message(option)
 
-    def get_message_style(self, is_user):
-        if is_user:
-            text_color = 'black' if self.current_theme == 'light' else 'white'
-            background_color = '#e0e0e0' if self.current_theme == 'light' else '#424242'
-            return f"""
-                QLabel {{
-                    background-color: {background_color};
-                    color: {text_color};
-                    border-radius: 15px;
-                    padding: 10px;
-                    margin: 5px;
-                    font-family: 'Inter';
-                    border: none;
-                }}
-            """
-        else:
-            text_color = 'black' if self.current_theme == 'light' else 'white'
-            return f"""
-                QLabel {{
-                    color: {text_color};
-                    background-color: transparent;
-                    padding: 10px;
-                    margin: 5px;
-                    font-family: 'Inter';
-                    border: none;
-                }}
-            """
-
     def send_message(self):
         user_text = self.text_input.toPlainText().strip()
         if user_text:
@@ -530,6 +353,9 @@ class ChatGPTWindow(QWidget):
             current_question = self.questions[self.current_question_index]
             variable_name = current_question.get('variable', current_question['id'])
             self.respostas_coletadas[variable_name] = message
+            if current_question.get("options") and self.e_ultima_pergunta(current_question):
+                # Frequências usadas para antecipar a recomendação mais provável
+                self.preditor.registrar(current_question['id'], message)
 
             # Obter o índice da próxima pergunta com base na ramificação
             next_question_index = self.get_next_question_index(current_question, message)
@@ -538,13 +364,18 @@ class ChatGPTWindow(QWidget):
             if self.current_question_index < len(self.questions):
                 next_question = self.questions[self.current_question_index]
                 self.add_message(next_question["question"], is_user=False, options=next_question.get("options"))
+                if self.preditor.ativo and next_question.get("options") and self.e_ultima_pergunta(next_question):
+                    self.previsao = asyncio.ensure_future(self.prever_ultima_resposta(next_question))
             else:
                 # Iniciar processamento
                 asyncio.create_task(self.start_processing())
         else:
             pass  # Conversa já terminou
 
-    def get_next_question_index(self, current_question, message):
+    def get_next_question_index(self, current_question, message, question_index=None):
+        # question_index: posição de current_question; por padrão, a pergunta atual
+        if question_index is None:
+            question_index = self.current_question_index
         branching = current_question.get('branching', {})
         # Normalizar a mensagem para correspondência
         normalized_message = message.strip().lower()
@@ -557,7 +388,39 @@ class ChatGPTWindow(QWidget):
                     if question.get('id') == next_question_id:
                         return index
         # Caso contrário, ir para a próxima pergunta
-        return self.current_question_index + 1
+        return question_index + 1
+
+    def e_ultima_pergunta(self, question):
+        # Última pergunta: qualquer opção escolhida encerra o questionário
+        indice = self.questions.index(question)
+        return all(
+            self.get_next_question_index(question, opcao, indice) >= len(self.questions)
+            for opcao in question.get("options") or [""]
+        )
+
+    async def prever_ultima_resposta(self, question):
+        try:
+            todos_produtos, versao_catalogo = await self.obter_catalogo()
+            if not todos_produtos:
+                return
+            self.preditor.preparar(
+                question['id'],
+                question.get('variable', question['id']),
+                question["options"],
+                self.respostas_coletadas,
+                self.retriever,
+                self.config,
+                versao_catalogo,
+                self.cache_respostas
+            )
+        except Exception as e:
+            logging.warning(f"Não foi possível preparar as opções da última pergunta: {e}")
+
+    def cancelar_previsao(self):
+        if self.previsao is not None:
+            self.previsao.cancel()
+            self.previsao = None
+        self.preditor.cancelar()
 
     def start_conversa(self):
         if self.conversa_ativa:
@@ -574,30 +437,118 @@ class ChatGPTWindow(QWidget):
             first_question = self.questions[self.current_question_index]
             self.add_message(first_question["question"], is_user=False, options=first_question.get("options"))
 
+        # Deixa o catálogo pronto enquanto o cliente responde às perguntas
+        QTimer.singleShot(0, self.iniciar_aquecimento)
+
+    def iniciar_aquecimento(self):
+        # Um único carregamento, compartilhado por start_processing e pela previsão
+        if self.aquecimento is not None and not self.aquecimento.done():
+            return self.aquecimento
+        self.ultimo_progresso = None
+        self.aquecimento = asyncio.ensure_future(self.preparar_catalogo())
+        self.aquecimento.add_done_callback(self.aquecimento_concluido)
+        return self.aquecimento
+
+    def aquecimento_concluido(self, tarefa):
+        if not tarefa.cancelled() and tarefa.exception() is not None:
+            logging.warning(f"Carregamento antecipado do catálogo falhou: {tarefa.exception()}")
+
+    def cancelar_aquecimento(self):
+        if self.aquecimento is not None:
+            self.aquecimento.cancel()
+            self.aquecimento = None
+
+    async def preparar_catalogo(self):
+        # Usar o arquivo de URLs definido nas configurações
+        urls_file = self.urls_file if self.urls_file else 'urls.txt'
+        urls = await network.ler_urls_arquivo(urls_file)
+        cache = cache_module.get_store()
+        # Uma única consulta pelo índice para as URLs que não estão em memória
+        cache.get_many([cache_module.chave_url(url) for url in urls])
+
+        agendador = scheduler.criar_agendador(self.config)
+        results = await agendador.executar(
+            urls,
+            lambda url: network.extrair_conteudo(url, cache, agendador.limiter),
+            progresso=self.progresso_catalogo,
+            default=list
+        )
+        # Confirma de uma vez as gravações feitas durante a busca
+        cache.flush()
+        logging.info(f"Catálogo na versão {cache.versao_catalogo}.")
+        todos_produtos = []
+        for produtos in results:
+            todos_produtos.extend(produtos)
+        if todos_produtos:
+            self.retriever.atualizar(todos_produtos, assinatura=(cache.versao_catalogo, tuple(urls)))
+        return todos_produtos, cache.versao_catalogo
+
+    def progresso_catalogo(self, concluidas, total):
+        # O carregamento roda em segundo plano; a linha de carregamento só
+        # é atualizada enquanto start_processing está esperando por ele
+        self.ultimo_progresso = (concluidas, total)
+        if self.aguardando_catalogo:
+            self.update_loading_progress(concluidas, total)
+
+    async def obter_catalogo(self):
+        # Normalmente o aquecimento já terminou e só resta ler o resultado.
+        # shield: cancelar quem espera (ex.: a previsão) não cancela o carregamento compartilhado
+        tarefa = self.aquecimento
+        if tarefa is None or tarefa.cancelled():
+            tarefa = self.iniciar_aquecimento()
+        try:
+            return await asyncio.shield(tarefa)
+        except asyncio.CancelledError:
+            if not tarefa.cancelled():
+                raise
+        except Exception as e:
+            logging.warning(f"Carregamento do catálogo falhou ({e}); tentando novamente.")
+        # Se outro chamador já recomeçou o carregamento, espera por ele em vez de abrir outro
+        return await asyncio.shield(self.iniciar_aquecimento())
+
     async def start_processing(self):
         self.add_loading_indicator()
         self.block_send(True)
 
         try:
-            # Usar o arquivo de URLs definido nas configurações
-            urls_file = self.urls_file if self.urls_file else 'urls.txt'
-            urls = await network.ler_urls_arquivo(urls_file)
-            cache = cache_module.carregar_cache()
-
-            tasks = [network.extrair_conteudo(url, cache) for url in urls]
-            results = await asyncio.gather(*tasks)
-            todos_produtos = []
-            for produtos in results:
-                todos_produtos.extend(produtos)
-
-            if todos_produtos:
+            self.aguardando_catalogo = True
+            if self.ultimo_progresso is not None:
+                self.update_loading_progress(*self.ultimo_progresso)
+            try:
+                todos_produtos, versao_catalogo = await self.obter_catalogo()
+            finally:
+                self.aguardando_catalogo = False
+
+            if self.previsao is not None and not self.previsao.done():
+                # A resposta chegou antes do pré-cálculo terminar
+                self.previsao.cancel()
+            self.previsao = None
+            preparada, antecipada, saida = self.preditor.obter(self.respostas_coletadas)
+
+            if antecipada is not None:
+                # A recomendação desta opção já foi pedida: exibe o que chegou e segue o streaming
+                saida.conectar(self.update_result_streaming)
+                try:
+                    await antecipada
+                except Exception as e:
+                    logging.warning(f"Recomendação antecipada falhou ({e}); consultando novamente.")
+                    antecipada = None
+            if antecipada is None and todos_produtos:
+                # Só os produtos mais relevantes para as respostas vão para o prompt
+                if preparada is not None:
+                    produtos_relevantes = preparada.produtos
+                else:
+                    produtos_relevantes = self.retriever.buscar(self.respostas_coletadas)
                 await ai.consultar_openai(
-                    todos_produtos,
+                    produtos_relevantes,
                     self.respostas_coletadas,
                     self.config,
-                    callback=self.update_result_streaming
+                    callback=self.update_result_streaming,
+                    cache_respostas=self.cache_respostas,
+                    versao_catalogo=versao_catalogo,
+                    preparada=preparada.consulta if preparada is not None else None
                 )
-            else:
+            elif antecipada is None:
                 self.display_result("Nenhum produto encontrado nas URLs fornecidas.")
         except Exception as e:
             logging.error(f"Erro: {e}")
@@ -605,21 +556,15 @@ class ChatGPTWindow(QWidget):
 
     def update_result_streaming(self, text):
         if not hasattr(self, 'streaming_label'):
-            self.streaming_label = QLabel("", self)
-            self.streaming_label.setWordWrap(True)
-            self.streaming_label.setFont(self.message_font)
-            self.streaming_label.setStyleSheet(self.get_message_style(False))
-            self.chat_display.addWidget(self.streaming_label)
-            self.scroll_to_bottom()
-            # Manter referência para evitar coleta de lixo
-            self.message_labels.append(self.streaming_label)
-        self.streaming_label.setText(self.streaming_label.text() + text)
+            # Linha com documento próprio: cada lote entra no fim, sem refazer o texto anterior
+            self.streaming_label = self.transcript_model.adicionar_documento(self.transcript.delegate.fonte)
+        # Chamado uma vez por lote (ver streaming.StreamCoalescer), não por token
+        self.streaming_label.append(text)
         self.scroll_to_bottom()
 
     def display_result(self, result):
         if hasattr(self, 'streaming_label'):
-            self.chat_display.removeWidget(self.streaming_label)
-            self.streaming_label.deleteLater()
+            self.transcript_model.remover(self.streaming_label)
             del self.streaming_label
         self.add_message(result, is_user=False)
         self.conversa_ativa = False
@@ -632,61 +577,38 @@ class ChatGPTWindow(QWidget):
         self.block_send(False)
 
     def normalize_string(self, s):
-        return ''.join(
-            c for c in unicodedata.normalize('NFD', s)
-            if unicodedata.category(c) != 'Mn'
-        ).lower()
-
-    def scroll_to_bottom(self):
-        QTimer.singleShot(100, lambda: self.scroll_area.verticalScrollBar().setValue(
-            self.scroll_area.verticalScrollBar().maximum()))
-
-    def resizeEvent(self, event):
-        super().resizeEvent(event)
-        self.update_message_widths()
-
-    def update_message_widths(self):
-        max_width = int(self.width() * 0.7)
-        for i in range(self.chat_display.count()):
-            layout = self.chat_display.itemAt(i)
-            if layout is not None:
-                for j in range(layout.count()):
-                    widget = layout.itemAt(j).widget()
-                    if widget is not None:
-                        label = widget.findChild(QLabel)
-                        if label:
-                            label.setMaximumWidth(max_width)
+        return retrieval.normalize_string(s)
+
+    def scroll_to_bottom(self, forcar=False):
+        self.rolagem.solicitar(forcar)
 
     def clear_conversation(self):
-        self.clear_layout(self.chat_display)
+        self.transcript_model.limpar()
+        self.aguardando_catalogo = False
         self.conversa_ativa = False
         self.respostas_coletadas = {}
         self.current_question_index = 0
+        self.cancelar_previsao()
+        self.animador.parar()
+        self.is_displaying = False
         self.message_queue.clear()
-        self.message_labels.clear()  # Limpar referências para evitar vazamento de memória
+        # As referências às linhas removidas deixam de valer
+        for atributo in ('streaming_label', 'loading_label'):
+            if hasattr(self, atributo):
+                delattr(self, atributo)
         self.start_conversa()
 
-    def clear_layout(self, layout):
-        if layout is not None:
-            while layout.count():
-                child = layout.takeAt(0)
-                if child.widget():
-                    child.widget().deleteLater()
-                elif child.layout():
-                    self.clear_layout(child.layout())
-
     def add_loading_indicator(self):
-        self.loading_label = QLabel("Processando...", self)
-        self.loading_label.setStyleSheet(self.get_message_style(False))
-        self.chat_display.addWidget(self.loading_label)
+        self.loading_label = self.transcript_model.adicionar("Processando...", is_user=False)
         self.scroll_to_bottom()
-        # Manter referência
-        self.message_labels.append(self.loading_label)
+
+    def update_loading_progress(self, concluidas, total):
+        if hasattr(self, 'loading_label'):
+            self.loading_label.setText(f"Processando... ({concluidas}/{total} páginas)")
 
     def remove_loading_indicator(self):
         if hasattr(self, 'loading_label'):
-            self.chat_display.removeWidget(self.loading_label)
-            self.loading_label.deleteLater()
+            self.transcript_model.remover(self.loading_label)
             del self.loading_label
 
     def block_send(self, block):
@@ -700,6 +622,7 @@ class ChatGPTWindow(QWidget):
         self.settings_window.show()
 
     def reload_config(self):
+        self.cancelar_previsao()
         self.config = load_config()
         self.questions = self.config.get('questions', [])
         self.prompts = self.config.get('prompts', {})
@@ -707,6 +630,15 @@ class ChatGPTWindow(QWidget):
         self.site_link = self.config.get('site_link', '')
         self.urls_file = self.config.get('urls_file', 'urls.txt')
         self.option_button_color = self.config.get('option_button_color', '#2B4FFF')
+        self.apply_transcript_colors()
+        network.configurar_rede(self.config)
+        extractor.configurar_extracao(self.config)
+        cache_module.configurar_cache(self.config)
+        self.retriever = retrieval.criar_retriever(self.config)
+        self.cache_respostas = response_cache.criar_cache_respostas(cache_module.get_store().conn, self.config)
+        self.preditor = predictive.criar_preditor(cache_module.get_store().conn, self.config)
+        # O catálogo carregado antes pode vir de outras URLs ou outra configuração
+        self.cancelar_aquecimento()
         # Reiniciar a conversa
         self.clear_conversation()
 
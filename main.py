@@ -4,32 +4,52 @@ import sys
 import logging
 from PyQt6.QtWidgets import QApplication
 from gui import ChatGPTWindow
+import network
+import ai
+import extractor
+import cache as cache_module
 import os
 from dotenv import load_dotenv
 import qasync
 import asyncio
+import multiprocessing
 
-# Carrega variáveis de ambiente
-load_dotenv()
+def configurar():
+    # Fica fora do nível do módulo: os workers do pool de análise (spawn)
+    # importam este arquivo de novo e não devem reabrir o app.log
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("app.log"),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
 
-# Configura o logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+async def encerrar(tarefas):
+    # Libera os recursos compartilhados antes de fechar o loop
+    for tarefa in tarefas:
+        tarefa.cancel()
+    await asyncio.gather(*tarefas, return_exceptions=True)
+    await network.fechar_sessao()
+    await ai.fechar_cliente()
+    extractor.encerrar_pool()
+    cache_module.fechar_store()
 
-async def main():
+def main():
+    configurar()
     app = QApplication(sys.argv)
     loop = qasync.QEventLoop(app)
     asyncio.set_event_loop(loop)
     window = ChatGPTWindow()
     window.show()
     with loop:
+        tarefas = [loop.create_task(cache_module.manutencao_periodica())]
         loop.run_forever()
+        loop.run_until_complete(encerrar(tarefas))
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Necessário para o pool de processos em executáveis congelados (PyInstaller etc.)
+    multiprocessing.freeze_support()
+    main()
@@ -4,45 +4,251 @@ import aiohttp
 import asyncio
 import logging
 import time
-from bs4 import BeautifulSoup
-from cache import salvar_cache
+import cache as cache_module
+import extractor
 import hashlib
+from urllib.parse import urlsplit
 
-async def fetch(session, url):
+# Tamanho dos blocos lidos da resposta HTTP
+CHUNK_SIZE = 64 * 1024
+
+# Limites padrão do pool de conexões (podem ser sobrescritos em config['network'])
+NETWORK_DEFAULTS = {
+    "limit": 100,               # conexões simultâneas no total
+    "limit_per_host": 8,        # conexões simultâneas por host
+    "dns_cache_ttl": 300,       # segundos que uma resolução DNS fica em cache
+    "keepalive_timeout": 30,    # segundos que uma conexão ociosa fica aberta
+    "request_timeout": 10,      # timeout total de cada requisição
+    "background_revalidations": 4,  # revalidações simultâneas em segundo plano
+}
+
+
+class TransientFetchError(Exception):
+    """Falha que pode desaparecer numa nova tentativa (timeout, 429, 5xx...)."""
+
+
+class SessionManager:
+    """Mantém uma única ``aiohttp.ClientSession`` com conexões keep-alive.
+
+    Todas as buscas reutilizam o mesmo conector, evitando um novo DNS, TCP e
+    TLS para cada URL do catálogo.
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(NETWORK_DEFAULTS)
+        if options:
+            self.options.update(options)
+        self._session = None
+        self._lock = None
+
+    def configure(self, options):
+        # As novas opções só valem para a próxima sessão criada
+        self.options = dict(NETWORK_DEFAULTS)
+        if options:
+            self.options.update(options)
+
+    async def get_session(self):
+        if self._session is not None and not self._session.closed:
+            return self._session
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.options["limit"],
+                    limit_per_host=self.options["limit_per_host"],
+                    ttl_dns_cache=self.options["dns_cache_ttl"],
+                    use_dns_cache=True,
+                    keepalive_timeout=self.options["keepalive_timeout"],
+                    enable_cleanup_closed=True,
+                )
+                timeout = aiohttp.ClientTimeout(total=self.options["request_timeout"])
+                self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+                logging.info(
+                    f"Sessão HTTP criada (limite total={self.options['limit']}, "
+                    f"por host={self.options['limit_per_host']})."
+                )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # Dá tempo para o fechamento das conexões SSL subjacentes
+            await asyncio.sleep(0.25)
+            logging.info("Sessão HTTP encerrada.")
+        self._session = None
+
+
+session_manager = SessionManager()
+
+
+def configurar_rede(config):
+    session_manager.configure(config.get('network', {}))
+
+
+async def fechar_sessao():
+    # Revalidações pendentes não devem usar a sessão depois de fechada
+    tarefas = list(_revalidacoes.values())
+    for tarefa in tarefas:
+        tarefa.cancel()
+    await asyncio.gather(*tarefas, return_exceptions=True)
+    await session_manager.close()
+
+
+class PaginaBaixada:
+    def __init__(self, status, produtos=None, etag=None, last_modified=None, body_hash=None, corpo_repetido=False):
+        self.status = status
+        self.produtos = produtos
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        # O corpo é idêntico ao da última versão guardada: nada foi analisado
+        self.corpo_repetido = corpo_repetido
+
+    @property
+    def nao_modificada(self):
+        return self.status == 304 or self.corpo_repetido
+
+
+async def fetch(session, url, headers=None, hash_anterior=None):
     try:
-        async with session.get(url, timeout=10) as response:
+        async with session.get(url, headers=headers) as response:
             response.raise_for_status()
-            return await response.text()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if response.status == 304:
+                return PaginaBaixada(304, etag=etag, last_modified=last_modified)
+
+            body_hash = hashlib.sha256()
+            if extractor.parser_pool.ativo or hash_anterior:
+                # Baixa o corpo inteiro antes de analisar, para poder comparar o hash
+                blocos = []
+                async for bloco in response.content.iter_chunked(CHUNK_SIZE):
+                    body_hash.update(bloco)
+                    blocos.append(bloco)
+                if hash_anterior and body_hash.hexdigest() == hash_anterior:
+                    return PaginaBaixada(
+                        response.status,
+                        etag=etag,
+                        last_modified=last_modified,
+                        body_hash=hash_anterior,
+                        corpo_repetido=True
+                    )
+                corpo = b''.join(blocos)
+                if extractor.parser_pool.ativo:
+                    # O corpo cru vai para o pool; a interface só recebe a lista de produtos
+                    produtos = await extractor.parser_pool.extrair(corpo, response.charset)
+                else:
+                    produtos = extractor.extrair_produtos_bytes(corpo, response.charset)
+            else:
+                # Analisa o HTML conforme os blocos chegam, sem montar a página inteira
+                extrator = extractor.criar_extrator()
+                decoder = extractor.criar_decoder(response.charset)
+                async for bloco in response.content.iter_chunked(CHUNK_SIZE):
+                    body_hash.update(bloco)
+                    extrator.feed(decoder.decode(bloco))
+                extrator.feed(decoder.decode(b'', final=True))
+                produtos = extrator.close()
+            return PaginaBaixada(
+                response.status,
+                produtos=produtos,
+                etag=etag,
+                last_modified=last_modified,
+                body_hash=body_hash.hexdigest()
+            )
+    except aiohttp.ClientResponseError as e:
+        if e.status == 429 or e.status >= 500:
+            raise TransientFetchError(f"HTTP {e.status}") from e
+        logging.error(f"Erro ao acessar a página {url}: {e}")
+        return None
+    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+        raise TransientFetchError(str(e) or type(e).__name__) from e
     except Exception as e:
         logging.error(f"Erro ao acessar a página {url}: {e}")
         return None
 
-async def extrair_conteudo(url, cache):
-    cache_key = hashlib.md5(url.encode()).hexdigest()
+def cabecalhos_condicionais(entrada):
+    headers = {}
+    if entrada:
+        if entrada.get('etag'):
+            headers['If-None-Match'] = entrada['etag']
+        if entrada.get('last_modified'):
+            headers['If-Modified-Since'] = entrada['last_modified']
+    return headers
 
-    if cache_key in cache:
+# Revalidações de entradas expiradas rodando em segundo plano, por chave
+_revalidacoes = {}
+_limite_revalidacoes = None
+
+
+async def extrair_conteudo(url, cache, limiter=None):
+    cache_key = cache_module.chave_url(url)
+    entrada = cache.get(cache_key)
+
+    if entrada and not cache_module.expirado(entrada):
         logging.info(f"Produtos carregados do cache para a URL: {url}")
-        return cache[cache_key]['data']
-
-    async with aiohttp.ClientSession() as session:
-        content = await fetch(session, url)
-        if content:
-            soup = BeautifulSoup(content, 'html.parser')
-            produtos_html = soup.find_all('h1', class_='c-dark title-big mb-0')
-            descricoes_html = soup.find_all('article', class_='product-text')
-
-            produtos = []
-            for titulo, descricao in zip(produtos_html, descricoes_html):
-                titulo_texto = titulo.get_text(strip=True)
-                descricao_texto = descricao.get_text(strip=True)
-                produtos.append(f"{titulo_texto}: {descricao_texto}")
-            
-            # Salva no cache
-            salvar_cache(cache_key, produtos)
-            logging.info(f"{len(produtos)} produtos extraídos e salvos no cache para a URL: {url}")
-            return produtos
-        else:
-            return []
+        return entrada['data']
+
+    if entrada and cache_module.pode_servir_expirado(entrada, cache.options):
+        agendar_revalidacao(url, cache, entrada, limiter)
+        logging.info(f"Produtos expirados servidos do cache enquanto a URL é atualizada: {url}")
+        return entrada['data']
+
+    return await atualizar_conteudo(url, cache, entrada, limiter)
+
+
+def agendar_revalidacao(url, cache, entrada, limiter=None):
+    global _limite_revalidacoes
+    cache_key = cache_module.chave_url(url)
+    if cache_key in _revalidacoes:
+        return
+    if _limite_revalidacoes is None:
+        _limite_revalidacoes = asyncio.Semaphore(session_manager.options["background_revalidations"])
+
+    async def revalidar():
+        try:
+            async with _limite_revalidacoes:
+                await atualizar_conteudo(url, cache, entrada, limiter)
+        except Exception as e:
+            logging.error(f"Erro ao revalidar em segundo plano a URL {url}: {e}")
+        finally:
+            del _revalidacoes[cache_key]
+            if not _revalidacoes:
+                cache.flush()
+
+    _revalidacoes[cache_key] = asyncio.ensure_future(revalidar())
+
+
+async def atualizar_conteudo(url, cache, entrada=None, limiter=None):
+    cache_key = cache_module.chave_url(url)
+    if limiter is not None:
+        # A taxa por host só vale para requisições de verdade, nunca para acertos do cache
+        await limiter.aguardar(urlsplit(url).netloc)
+    session = await session_manager.get_session()
+    pagina = await fetch(
+        session, url,
+        headers=cabecalhos_condicionais(entrada),
+        hash_anterior=entrada.get('body_hash') if entrada else None
+    )
+    if pagina and pagina.nao_modificada and entrada:
+        # A página não mudou (304 ou mesmo conteúdo): reaproveita os produtos e renova o horário
+        cache.renovar(cache_key, etag=pagina.etag, last_modified=pagina.last_modified)
+        logging.info(f"Página inalterada, produtos do cache revalidados para a URL: {url}")
+        return entrada['data']
+    if pagina and pagina.produtos is not None:
+        produtos = pagina.produtos
+
+        # Salva no cache junto com os validadores da página
+        cache.salvar(
+            cache_key, produtos,
+            etag=pagina.etag,
+            last_modified=pagina.last_modified,
+            body_hash=pagina.body_hash
+        )
+        logging.info(f"{len(produtos)} produtos extraídos e salvos no cache para a URL: {url}")
+        return produtos
+    else:
+        return []
 
 async def ler_urls_arquivo(caminho_arquivo):
     try:
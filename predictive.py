@@ -0,0 +1,200 @@
+# predictive.py
+
+import asyncio
+import logging
+import time
+
+import ai
+from retrieval import normalize_string
+
+# Pré-cálculo da última pergunta (pode ser sobrescrito em config['predictive'])
+PREDICTIVE_DEFAULTS = {
+    "enabled": True,            # monta busca e prompt de cada opção enquanto o cliente lê a pergunta
+    "llm_prefetch": False,      # também dispara a recomendação da opção mais provável
+    "min_probability": 0.6,     # frequência histórica mínima da opção para o pedido antecipado
+    "min_samples": 10,          # respostas registradas antes de confiar na frequência
+    "daily_budget": 20,         # pedidos antecipados por dia, acertados ou não
+}
+
+
+def normalizar_opcao(valor):
+    return normalize_string(str(valor)).strip()
+
+
+class SaidaEspeculativa:
+    """Guarda o texto de uma recomendação antecipada até alguém exibi-lo.
+
+    Quando a interface se conecta, recebe de uma vez o que já chegou e, dali
+    em diante, os lotes seguintes do streaming.
+    """
+
+    def __init__(self):
+        self.partes = []
+        self.destino = None
+
+    def __call__(self, texto):
+        if self.destino is None:
+            self.partes.append(texto)
+        else:
+            self.destino(texto)
+
+    def conectar(self, destino):
+        if self.partes:
+            destino(''.join(self.partes))
+            self.partes.clear()
+        self.destino = destino
+
+
+class OpcaoPreparada:
+    def __init__(self, respostas, produtos, consulta):
+        self.respostas = respostas
+        self.produtos = produtos
+        self.consulta = consulta
+
+
+class PredictiveStage:
+    """Prepara de antemão a recomendação para cada opção da última pergunta.
+
+    As frequências das respostas ficam no mesmo banco do cache, assim como o
+    consumo diário do orçamento de pedidos antecipados.
+    """
+
+    def __init__(self, conn, options=None):
+        self.conn = conn
+        self.options = dict(PREDICTIVE_DEFAULTS)
+        if options:
+            self.options.update(options)
+        self.variavel = None
+        self.preparadas = {}
+        self.opcao_antecipada = None
+        self.tarefa = None
+        self.saida = None
+        self.contadores = {"prefetched": 0, "used": 0, "cancelled": 0}
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS answer_stats (
+                    question TEXT,
+                    answer TEXT,
+                    count INTEGER,
+                    PRIMARY KEY (question, answer)
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS prefetch_budget (
+                    day TEXT PRIMARY KEY,
+                    used INTEGER
+                )
+            ''')
+
+    @property
+    def ativo(self):
+        return self.options["enabled"]
+
+    def registrar(self, pergunta, resposta):
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO answer_stats (question, answer, count) VALUES (?, ?, 1) '
+                'ON CONFLICT (question, answer) DO UPDATE SET count = count + 1',
+                (pergunta, normalizar_opcao(resposta))
+            )
+
+    def frequencias(self, pergunta):
+        return dict(self.conn.execute('SELECT answer, count FROM answer_stats WHERE question = ?', (pergunta,)))
+
+    def mais_provavel(self, pergunta, opcoes):
+        contagens = self.frequencias(pergunta)
+        contagens = {opcao: contagens.get(opcao, 0) for opcao in opcoes}
+        total = sum(contagens.values())
+        if not total or total < self.options["min_samples"]:
+            return None
+        opcao = max(contagens, key=contagens.get)
+        if contagens[opcao] / total < self.options["min_probability"]:
+            return None
+        return opcao
+
+    def _consumir_orcamento(self):
+        dia = time.strftime('%Y-%m-%d')
+        with self.conn:
+            row = self.conn.execute('SELECT used FROM prefetch_budget WHERE day = ?', (dia,)).fetchone()
+            usados = row[0] if row else 0
+            if usados >= self.options["daily_budget"]:
+                return False
+            self.conn.execute('DELETE FROM prefetch_budget WHERE day <> ?', (dia,))
+            self.conn.execute('REPLACE INTO prefetch_budget (day, used) VALUES (?, ?)', (dia, usados + 1))
+        return True
+
+    def preparar(self, pergunta, variavel, opcoes, respostas, retriever, config, versao_catalogo, cache_respostas):
+        self.cancelar()
+        self.variavel = variavel
+        for opcao in opcoes:
+            respostas_opcao = dict(respostas)
+            respostas_opcao[variavel] = opcao
+            produtos = retriever.buscar(respostas_opcao)
+            consulta = ai.preparar_consulta(produtos, respostas_opcao, config)
+            self.preparadas[normalizar_opcao(opcao)] = OpcaoPreparada(respostas_opcao, produtos, consulta)
+        logging.info(f"Busca e prompt preparados para {len(self.preparadas)} opções de '{pergunta}'.")
+
+        if not self.options["llm_prefetch"]:
+            return
+        provavel = self.mais_provavel(pergunta, list(self.preparadas))
+        if provavel is None:
+            return
+        preparada = self.preparadas[provavel]
+        if cache_respostas is not None and cache_respostas.ativo and cache_respostas.get(
+            preparada.consulta.chave_cache(preparada.respostas, versao_catalogo)
+        ) is not None:
+            return  # A recomendação já está no cache; não há o que antecipar
+        if not self._consumir_orcamento():
+            logging.info("Orçamento diário de pedidos antecipados esgotado.")
+            return
+        self.opcao_antecipada = provavel
+        self.saida = SaidaEspeculativa()
+        self.tarefa = asyncio.ensure_future(ai.consultar_openai(
+            preparada.produtos,
+            preparada.respostas,
+            config,
+            callback=self.saida,
+            cache_respostas=cache_respostas,
+            versao_catalogo=versao_catalogo,
+            preparada=preparada.consulta
+        ))
+        self.contadores["prefetched"] += 1
+        logging.info(f"Recomendação antecipada para a opção '{provavel}'.")
+
+    def obter(self, respostas):
+        # Devolve (opção preparada, tarefa antecipada, saída) se as respostas baterem com uma opção
+        if self.variavel is None or self.variavel not in respostas:
+            self.cancelar()
+            return None, None, None
+        chave = normalizar_opcao(respostas[self.variavel])
+        preparada = self.preparadas.get(chave)
+        iguais = preparada is not None and all(
+            valor == respostas.get(nome)
+            for nome, valor in preparada.respostas.items() if nome != self.variavel
+        ) and len(preparada.respostas) == len(respostas)
+        if not iguais:
+            self.cancelar()
+            return None, None, None
+        tarefa = saida = None
+        if self.tarefa is not None and self.opcao_antecipada == chave:
+            tarefa, saida = self.tarefa, self.saida
+            self.tarefa = self.saida = None
+            self.contadores["used"] += 1
+        self.cancelar()
+        return preparada, tarefa, saida
+
+    def cancelar(self):
+        if self.tarefa is not None:
+            if not self.tarefa.done():
+                self.tarefa.cancel()
+                self.contadores["cancelled"] += 1
+                logging.info(f"Recomendação antecipada cancelada; contadores: {self.contadores}.")
+            self.tarefa = None
+        self.saida = None
+        self.opcao_antecipada = None
+        self.variavel = None
+        self.preparadas = {}
+
+
+def criar_preditor(conn, config):
+    return PredictiveStage(conn, config.get('predictive', {}))
@@ -0,0 +1,115 @@
+# response_cache.py
+
+import hashlib
+import json
+import logging
+import time
+import zlib
+
+from retrieval import normalize_string
+
+# Valores padrão do cache de recomendações (podem ser sobrescritos em config['response_cache'])
+RESPONSE_CACHE_DEFAULTS = {
+    "enabled": True,
+    "ttl": 7 * 24 * 3600,           # segundos que uma recomendação pode ser reaproveitada
+    "max_entries": 500,
+    "max_bytes": 8 * 1024 * 1024,
+    "replay_chunk": 24,             # caracteres por chamada do callback ao reproduzir
+}
+
+
+def _hash(texto):
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def normalizar_respostas(respostas):
+    return {chave: normalize_string(str(valor)).strip() for chave, valor in sorted(respostas.items())}
+
+
+def chave_resposta(respostas, prompt_template, system_message, model, versao_catalogo, produtos):
+    partes = {
+        "respostas": normalizar_respostas(respostas),
+        "template": _hash(prompt_template),
+        "system": _hash(system_message),
+        "model": model,
+        "catalogo": versao_catalogo,
+        # Os produtos escolhidos dependem também da configuração da busca
+        "produtos": _hash("\n".join(produtos)),
+    }
+    return _hash(json.dumps(partes, sort_keys=True, ensure_ascii=False))
+
+
+class ResponseCache:
+    """Recomendações já geradas, guardadas no mesmo banco do cache de produtos."""
+
+    def __init__(self, conn, options=None):
+        self.conn = conn
+        self.options = dict(RESPONSE_CACHE_DEFAULTS)
+        if options:
+            self.options.update(options)
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    data BLOB,
+                    size INTEGER,
+                    created REAL,
+                    last_hit REAL
+                )
+            ''')
+
+    @property
+    def ativo(self):
+        return self.options["enabled"]
+
+    def get(self, key):
+        if not self.ativo:
+            return None
+        agora = time.time()
+        row = self.conn.execute(
+            'SELECT data FROM response_cache WHERE key = ? AND created > ?',
+            (key, agora - self.options["ttl"])
+        ).fetchone()
+        if row is None:
+            return None
+        with self.conn:
+            self.conn.execute('UPDATE response_cache SET last_hit = ? WHERE key = ?', (agora, key))
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def put(self, key, texto):
+        if not self.ativo or not texto:
+            return
+        agora = time.time()
+        data = zlib.compress(texto.encode('utf-8'))
+        with self.conn:
+            self.conn.execute(
+                'REPLACE INTO response_cache (key, data, size, created, last_hit) VALUES (?, ?, ?, ?, ?)',
+                (key, data, len(data), agora, agora)
+            )
+            self._evict(agora)
+
+    def _evict(self, agora):
+        self.conn.execute('DELETE FROM response_cache WHERE created <= ?', (agora - self.options["ttl"],))
+        linhas, usados = self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache').fetchone()
+        if linhas <= self.options["max_entries"] and usados <= self.options["max_bytes"]:
+            return
+        removidas = []
+        for key, tamanho in self.conn.execute('SELECT key, size FROM response_cache ORDER BY last_hit'):
+            if linhas <= self.options["max_entries"] and usados <= self.options["max_bytes"]:
+                break
+            removidas.append((key,))
+            linhas -= 1
+            usados -= tamanho
+        self.conn.executemany('DELETE FROM response_cache WHERE key = ?', removidas)
+        logging.info(f"{len(removidas)} recomendações removidas do cache de respostas.")
+
+    def reproduzir(self, texto, callback):
+        # Entrega o texto pelo mesmo caminho do streaming da OpenAI
+        if callback:
+            passo = max(1, self.options["replay_chunk"])
+            for inicio in range(0, len(texto), passo):
+                callback(texto[inicio:inicio + passo])
+
+
+def criar_cache_respostas(conn, config):
+    return ResponseCache(conn, config.get('response_cache', {}))
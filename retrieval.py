@@ -0,0 +1,188 @@
+# retrieval.py
+
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+
+# Valores padrão da seleção de produtos (podem ser sobrescritos em config['retrieval'])
+RETRIEVAL_DEFAULTS = {
+    "top_k": 20,        # produtos enviados ao prompt; 0 = todos
+    "k1": 1.5,
+    "b": 0.75,
+    "mode": "bm25",     # "bm25", "vector" ou "hybrid"
+    "rrf_k": 60,        # constante da fusão por posição recíproca (modo hybrid)
+}
+
+# Palavras muito comuns em português que não ajudam a diferenciar produtos
+STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e em entre para pela pelas pelo pelos
+por que se sem sob sobre um uma umas uns o os na nas no nos ou mais menos
+muito muita seu sua seus suas ser sao esta este isso isto ja nao sim tem
+""".split())
+
+# Plurais mais frequentes, do sufixo mais longo para o mais curto
+PLURAIS = (
+    ("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"),
+    ("ois", "ol"), ("uis", "ul"), ("res", "r"), ("zes", "z"), ("ns", "m"),
+)
+
+
+def normalize_string(s):
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', s)
+        if unicodedata.category(c) != 'Mn'
+    ).lower()
+
+
+def reduzir_plural(token):
+    if len(token) <= 3:
+        return token
+    for sufixo, troca in PLURAIS:
+        if token.endswith(sufixo):
+            return token[:-len(sufixo)] + troca
+    if token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenizar(texto):
+    return [
+        reduzir_plural(token)
+        for token in re.findall(r"[a-z0-9]+", normalize_string(texto))
+        if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """Índice invertido dos produtos, pontuado com BM25.
+
+    ``atualizar`` só tokeniza os produtos que entraram no catálogo e remove
+    os que saíram, em vez de reconstruir o índice a cada consulta.
+    """
+
+    def __init__(self, k1=RETRIEVAL_DEFAULTS["k1"], b=RETRIEVAL_DEFAULTS["b"]):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}      # termo -> {produto: frequência}
+        self.tamanhos = {}      # produto -> número de termos
+        self.ordem = []         # produtos na ordem do catálogo
+        self.total_termos = 0
+        self.assinatura = None
+
+    def __len__(self):
+        return len(self.tamanhos)
+
+    def _adicionar(self, produto):
+        termos = Counter(tokenizar(produto))
+        for termo, frequencia in termos.items():
+            self.postings.setdefault(termo, {})[produto] = frequencia
+        tamanho = sum(termos.values())
+        self.tamanhos[produto] = tamanho
+        self.total_termos += tamanho
+
+    def _remover(self, produto):
+        for termo in set(tokenizar(produto)):
+            documentos = self.postings.get(termo)
+            if documentos is not None:
+                documentos.pop(produto, None)
+                if not documentos:
+                    del self.postings[termo]
+        self.total_termos -= self.tamanhos.pop(produto)
+
+    def atualizar(self, produtos, assinatura=None):
+        if assinatura is not None and assinatura == self.assinatura:
+            return
+        novos = dict.fromkeys(produtos)
+        for produto in [p for p in self.tamanhos if p not in novos]:
+            self._remover(produto)
+        for produto in novos:
+            if produto not in self.tamanhos:
+                self._adicionar(produto)
+        self.ordem = list(novos)
+        self.assinatura = assinatura
+
+    def pontuar(self, consulta):
+        total = len(self.tamanhos)
+        if not total:
+            return {}
+        media = self.total_termos / total or 1.0
+        pontos = {}
+        for termo in set(tokenizar(consulta)):
+            documentos = self.postings.get(termo)
+            if not documentos:
+                continue
+            idf = math.log(1 + (total - len(documentos) + 0.5) / (len(documentos) + 0.5))
+            for produto, frequencia in documentos.items():
+                normalizacao = self.k1 * (1 - self.b + self.b * self.tamanhos[produto] / media)
+                pontos[produto] = pontos.get(produto, 0.0) + idf * frequencia * (self.k1 + 1) / (frequencia + normalizacao)
+        return pontos
+
+    def buscar(self, consulta, k):
+        if not k or k <= 0 or k >= len(self.ordem):
+            return list(self.ordem)
+        pontos = self.pontuar(consulta)
+        if not pontos:
+            # Nada em comum com as respostas: mantém a ordem do catálogo
+            return self.ordem[:k]
+        posicao = {produto: i for i, produto in enumerate(self.ordem)}
+        melhores = sorted(pontos, key=lambda p: (-pontos[p], posicao[p]))[:k]
+        if len(melhores) < k:
+            # Completa com o restante do catálogo, na ordem original
+            escolhidos = set(melhores)
+            melhores.extend([p for p in self.ordem if p not in escolhidos][:k - len(melhores)])
+        return melhores
+
+
+def combinar_rrf(listas, k, constante=RETRIEVAL_DEFAULTS["rrf_k"]):
+    # Reciprocal rank fusion: soma 1/(constante + posição) de cada lista
+    pontos = {}
+    for lista in listas:
+        for posicao, produto in enumerate(lista):
+            pontos[produto] = pontos.get(produto, 0.0) + 1.0 / (constante + posicao + 1)
+    return sorted(pontos, key=lambda p: -pontos[p])[:k]
+
+
+class ProductRetriever:
+    """Escolhe os produtos do prompt por BM25, por vetores ou pelos dois."""
+
+    def __init__(self, options=None):
+        self.options = dict(RETRIEVAL_DEFAULTS)
+        if options:
+            self.options.update(options)
+        self.bm25 = BM25Index(k1=self.options["k1"], b=self.options["b"])
+        self.vetores = None
+        if self.options["mode"] in ("vector", "hybrid"):
+            import vector_store
+            if vector_store.disponivel():
+                self.vetores = vector_store.VectorStore()
+            else:
+                logging.warning("numpy não está instalado (pip install numpy); busca vetorial desligada, usando apenas BM25.")
+
+    def atualizar(self, produtos, assinatura=None):
+        self.bm25.atualizar(produtos, assinatura)
+        if self.vetores is not None:
+            self.vetores.atualizar(produtos, assinatura)
+
+    def buscar(self, respostas):
+        consulta = consulta_das_respostas(respostas)
+        k = self.options["top_k"]
+        if not k or k <= 0 or k >= len(self.bm25.ordem) or self.vetores is None:
+            return self.bm25.buscar(consulta, k)
+        if self.options["mode"] == "vector":
+            encontrados = self.vetores.buscar(consulta, k)
+            return encontrados or self.bm25.buscar(consulta, k)
+        return combinar_rrf(
+            [self.bm25.buscar(consulta, k), self.vetores.buscar(consulta, k)],
+            k,
+            self.options["rrf_k"]
+        )
+
+
+def consulta_das_respostas(respostas):
+    return " ".join(str(valor) for valor in respostas.values())
+
+
+def criar_retriever(config):
+    return ProductRetriever(config.get('retrieval', {}))
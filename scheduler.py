@@ -0,0 +1,127 @@
+# scheduler.py
+
+import asyncio
+import logging
+import random
+import time
+
+from network import TransientFetchError
+
+# Valores padrão do agendador (podem ser sobrescritos em config['crawl'])
+CRAWL_DEFAULTS = {
+    "max_concurrency": 8,      # páginas sendo baixadas ao mesmo tempo
+    "per_host_rate": 4.0,      # requisições por segundo para cada host
+    "max_retries": 3,          # novas tentativas para falhas temporárias
+    "backoff_base": 0.5,       # segundos da primeira espera entre tentativas
+    "backoff_max": 10.0,       # espera máxima entre tentativas
+    "hot_patterns": [],        # trechos de URL que devem ser buscados primeiro
+}
+
+
+class HostRateLimiter:
+    """Espaça as requisições de cada host para no máximo ``rate`` por segundo."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_slot = {}
+
+    async def aguardar(self, host):
+        if not self.interval:
+            return
+        agora = time.monotonic()
+        slot = max(agora, self._next_slot.get(host, agora))
+        self._next_slot[host] = slot + self.interval
+        if slot > agora:
+            await asyncio.sleep(slot - agora)
+
+
+class CrawlScheduler:
+    """Executa as buscas do catálogo com concorrência limitada.
+
+    As URLs saem de uma fila de prioridade (páginas "quentes" primeiro) e
+    falhas temporárias são repetidas com backoff exponencial com jitter. A
+    taxa por host (``limiter``) é aplicada pelo job só quando ele vai à rede,
+    para que páginas servidas do cache não esperem.
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(CRAWL_DEFAULTS)
+        if options:
+            self.options.update(options)
+        self.limiter = HostRateLimiter(self.options["per_host_rate"])
+
+    def prioridade(self, url):
+        for padrao in self.options["hot_patterns"]:
+            if padrao and padrao in url:
+                return 0
+        return 1
+
+    def espera_backoff(self, tentativa):
+        # "Full jitter": sorteia entre zero e o teto exponencial
+        teto = min(self.options["backoff_max"], self.options["backoff_base"] * (2 ** tentativa))
+        return random.uniform(0, teto)
+
+    async def executar(self, urls, job, progresso=None, default=None):
+        total = len(urls)
+        resultados = [default() if callable(default) else default for _ in urls]
+        if not total:
+            return resultados
+
+        loop = asyncio.get_running_loop()
+        fila = asyncio.PriorityQueue()
+        for indice, url in enumerate(urls):
+            fila.put_nowait((self.prioridade(url), indice, 0, url))
+
+        restantes = total
+        concluido = asyncio.Event()
+
+        def finalizar():
+            nonlocal restantes
+            restantes -= 1
+            if restantes == 0:
+                concluido.set()
+            if progresso:
+                try:
+                    progresso(total - restantes, total)
+                except Exception as e:
+                    # Um erro na interface não pode parar a busca
+                    logging.error(f"Erro ao informar o progresso da busca: {e}")
+
+        async def worker():
+            while True:
+                prioridade, indice, tentativa, url = await fila.get()
+                try:
+                    resultados[indice] = await job(url)
+                except TransientFetchError as e:
+                    if tentativa < self.options["max_retries"]:
+                        espera = self.espera_backoff(tentativa)
+                        logging.warning(
+                            f"Falha temporária em {url} ({e}). Nova tentativa "
+                            f"{tentativa + 1}/{self.options['max_retries']} em {espera:.1f}s."
+                        )
+                        # Reenfileira sem ocupar um worker durante a espera
+                        loop.call_later(espera, fila.put_nowait, (prioridade, indice, tentativa + 1, url))
+                        continue
+                    logging.error(f"Desistindo de {url} após {tentativa + 1} tentativas: {e}")
+                except Exception as e:
+                    logging.error(f"Erro ao processar a URL {url}: {e}")
+                finalizar()
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(self.options["max_concurrency"], total)))]
+        espera = asyncio.ensure_future(concluido.wait())
+        try:
+            # Os workers só terminam por erro; nesse caso os demais são cancelados e o erro sobe
+            done, _ = await asyncio.wait([espera, *workers], return_when=asyncio.FIRST_COMPLETED)
+            for w in workers:
+                if w in done and not w.cancelled() and w.exception() is not None:
+                    raise w.exception()
+        finally:
+            espera.cancel()
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(espera, *workers, return_exceptions=True)
+        return resultados
+
+
+def criar_agendador(config):
+    return CrawlScheduler(config.get('crawl', {}))
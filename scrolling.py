@@ -0,0 +1,68 @@
+# scrolling.py
+
+from PyQt6.QtCore import QObject, QTimer
+
+# Rolagem automática do histórico (pode ser sobrescrita em config['scrolling'])
+SCROLLING_DEFAULTS = {
+    "frame_interval": 16,       # milissegundos; no máximo uma rolagem por quadro
+    "bottom_threshold": 24,     # pixels do fim ainda considerados "no fim"
+}
+
+
+class ScrollScheduler(QObject):
+    """Junta os pedidos de rolagem para o fim em no máximo uma rolagem por quadro.
+
+    Se o usuário subir a barra para reler algo, a rolagem automática fica
+    pausada até ele voltar ao fim (ou até um pedido com ``forcar=True``).
+    """
+
+    def __init__(self, scroll_area, options=None, parent=None):
+        super().__init__(parent)
+        self.options = dict(SCROLLING_DEFAULTS)
+        if options:
+            self.options.update(options)
+        self.barra = scroll_area.verticalScrollBar()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.options["frame_interval"])
+        self.timer.timeout.connect(self._rolar)
+        self.seguindo = True
+        self._rolando = False
+        self.contadores = {"requested": 0, "merged": 0, "performed": 0, "suppressed": 0}
+        self.barra.valueChanged.connect(self._valor_alterado)
+        # O layout pode crescer depois da rolagem; acompanha o novo fim no próximo quadro
+        self.barra.rangeChanged.connect(self._faixa_alterada)
+
+    def solicitar(self, forcar=False):
+        self.contadores["requested"] += 1
+        if forcar:
+            self.seguindo = True
+        if not self.seguindo:
+            self.contadores["suppressed"] += 1
+            return
+        if self.timer.isActive():
+            self.contadores["merged"] += 1
+            return
+        self.timer.start()
+
+    def _rolar(self):
+        if not self.seguindo:
+            self.contadores["suppressed"] += 1
+            return
+        self._rolando = True
+        try:
+            self.barra.setValue(self.barra.maximum())
+        finally:
+            self._rolando = False
+        self.contadores["performed"] += 1
+
+    def _faixa_alterada(self, minimo, maximo):
+        # Passa pelo mesmo timer: vários relayouts no quadro viram uma só rolagem
+        if self.seguindo and self.barra.value() != maximo:
+            self.solicitar()
+
+    def _valor_alterado(self, valor):
+        if self._rolando:
+            return
+        # Movimento do usuário: segue o fim só se a barra ficou perto dele
+        self.seguindo = valor >= self.barra.maximum() - self.options["bottom_threshold"]
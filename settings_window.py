@@ -115,12 +115,7 @@ class SettingsWindow(QDialog):
         # Define placeholder and behavior
         self.prompt_template_placeholder = """Exemplo de Template do Prompt:
 
-Você é um especialista em {area}. Use as informações fornecidas para recomendar os melhores produtos. Variáveis disponíveis: {variavel1}, {variavel2}.
-
-{informacoes_cliente}
-
-# Produtos Disponíveis:
-{produtos}
+Você é um especialista em produtos químicos. Use as informações fornecidas para recomendar os melhores produtos.
 
 # Formato de Saída:
 - Resumo das necessidades do cliente.
@@ -131,6 +126,13 @@ Você é um especialista em {area}. Use as informações fornecidas para recomen
 # Notes:
 - Utilize linguagem técnica adequada ao nível de conhecimento do cliente.
 - Apresente a resposta de forma clara, coesa e fluida, evitando o uso de formatação com asteriscos ou marcadores.
+
+# Produtos Disponíveis (mantenha os produtos e os dados do cliente no final, após as instruções):
+{produtos}
+
+# Informações do Cliente:
+{informacoes_cliente}
+Variáveis disponíveis: {variavel1}, {variavel2}.
 """
         if not self.prompts.get('prompt_template'):
             self.prompt_template_input.setText(self.prompt_template_placeholder)
@@ -0,0 +1,70 @@
+# streaming.py
+
+import asyncio
+import time
+
+# Entrega do texto em streaming para a interface (pode ser sobrescrito em config['streaming'])
+STREAMING_DEFAULTS = {
+    "flush_interval": 0.04,     # segundos entre duas atualizações da tela
+    "flush_chars": 512,         # entrega antes do intervalo se acumular isso de texto
+}
+
+
+class StreamCoalescer:
+    """Junta os pedaços do modelo e os entrega ao callback em lotes.
+
+    Cada token vira uma chamada de ``add``; o callback só é chamado quando o
+    intervalo expira ou o buffer passa de ``flush_chars``, limitando a taxa de
+    atualizações da interface independentemente da velocidade do provedor.
+    """
+
+    def __init__(self, callback, options=None):
+        self.callback = callback
+        self.options = dict(STREAMING_DEFAULTS)
+        if options:
+            self.options.update(options)
+        self.partes = []        # texto completo recebido
+        self._pendentes = []    # texto ainda não entregue ao callback
+        self._tamanho_pendente = 0
+        self._ultimo_flush = time.monotonic()
+        self._agendado = None
+        self.flushes = 0
+
+    def add(self, texto):
+        if not texto:
+            return
+        self.partes.append(texto)
+        if self.callback is None:
+            return
+        self._pendentes.append(texto)
+        self._tamanho_pendente += len(texto)
+        restante = self.options["flush_interval"] - (time.monotonic() - self._ultimo_flush)
+        if self._tamanho_pendente >= self.options["flush_chars"] or restante <= 0:
+            self.flush()
+        elif self._agendado is None:
+            # Garante a entrega mesmo que o próximo pedaço demore a chegar
+            self._agendado = asyncio.get_running_loop().call_later(restante, self.flush)
+
+    def flush(self):
+        if self._agendado is not None:
+            self._agendado.cancel()
+            self._agendado = None
+        self._ultimo_flush = time.monotonic()
+        if not self._pendentes:
+            return
+        texto = ''.join(self._pendentes)
+        self._pendentes.clear()
+        self._tamanho_pendente = 0
+        self.flushes += 1
+        self.callback(texto)
+
+    def texto(self):
+        return ''.join(self.partes)
+
+    def fechar(self):
+        self.flush()
+        return self.texto()
+
+
+def criar_coalescer(callback, config):
+    return StreamCoalescer(callback, config.get('streaming', {}))
@@ -0,0 +1,123 @@
+# test_ai.py
+
+import asyncio
+from types import SimpleNamespace
+
+import ai
+
+
+def pedaco(texto):
+    delta = SimpleNamespace(content=texto)
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+
+
+class RespostaFalsa:
+    def __init__(self, model, atraso):
+        self.model = model
+        self.atraso = atraso
+        self.fechada = False
+
+    def __aiter__(self):
+        return self._pedacos()
+
+    async def _pedacos(self):
+        await asyncio.sleep(self.atraso)
+        yield pedaco("Resposta de ")
+        yield pedaco(self.model)
+
+    async def close(self):
+        self.fechada = True
+
+
+class ClienteFalso:
+    """Cliente com a interface de chat.completions; cada modelo responde após o atraso dado."""
+
+    def __init__(self, atrasos):
+        self.atrasos = atrasos
+        self.respostas = []
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, model, **kwargs):
+        resposta = RespostaFalsa(model, self.atrasos[model])
+        self.respostas.append(resposta)
+        return resposta
+
+
+class ClienteComErro:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, model, **kwargs):
+        raise ai.OpenAIError("falha")
+
+
+class CacheFalso:
+    ativo = True
+
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, chave):
+        return self.dados.get(chave)
+
+    def put(self, chave, valor):
+        self.dados[chave] = valor
+
+
+def consultar(monkeypatch, atrasos, cache):
+    cliente = ClienteFalso(atrasos)
+
+    async def get_client(config):
+        return cliente
+
+    monkeypatch.setattr(ai.client_manager, 'get_client', get_client)
+    config = {'model': 'principal', 'openai': {'hedge': True, 'hedge_deadline': 0.05, 'fallback_model': 'reserva'}}
+    resultado = asyncio.run(ai.consultar_openai([], {'tipo': 'Aço'}, config, cache_respostas=cache, versao_catalogo=1))
+    return resultado, cliente
+
+
+def test_prefixo_estavel_igual_entre_clientes_com_produtos_diferentes():
+    aco = ai.preparar_consulta(["Primer Aço: anticorrosivo"], {'tipo': 'Aço', 'uso': 'Externo'}, {})
+    aluminio = ai.preparar_consulta(["Verniz Alumínio: incolor"], {'tipo': 'Alumínio', 'uso': 'Interno'}, {})
+
+    assert aco.prompt != aluminio.prompt
+    assert aco.prefixo == aluminio.prefixo
+
+
+def test_prefixo_estavel_termina_no_primeiro_campo():
+    template = ai.PromptTemplate("Instruções fixas.\n{produtos}\n{informacoes_cliente}")
+    variaveis = {'produtos': "Produto A", 'informacoes_cliente': "- Tipo: Aço"}
+
+    assert template.prefixo_estavel(variaveis) == "Instruções fixas.\n"
+    assert template.render(variaveis) == "Instruções fixas.\n{produtos}\n{informacoes_cliente}".format(**variaveis)
+
+
+def test_resposta_do_modelo_principal_vai_para_o_cache(monkeypatch):
+    cache = CacheFalso()
+    resultado, cliente = consultar(monkeypatch, {'principal': 0, 'reserva': 0}, cache)
+
+    assert resultado == "Resposta de principal"
+    assert list(cache.dados.values()) == [resultado]
+    assert all(resposta.fechada for resposta in cliente.respostas)
+
+
+def test_resposta_do_modelo_reserva_nao_vai_para_o_cache(monkeypatch):
+    cache = CacheFalso()
+    resultado, cliente = consultar(monkeypatch, {'principal': 1.0, 'reserva': 0}, cache)
+
+    assert resultado == "Resposta de reserva"
+    assert cache.dados == {}
+    assert all(resposta.fechada for resposta in cliente.respostas)
+
+
+def test_falha_nao_deixa_numeros_da_consulta_anterior(monkeypatch):
+    consultar(monkeypatch, {'principal': 0, 'reserva': 0}, None)
+    assert ai.ultimo_uso['model'] == 'principal'
+
+    async def get_client(config):
+        return ClienteComErro()
+
+    monkeypatch.setattr(ai.client_manager, 'get_client', get_client)
+    asyncio.run(ai.consultar_openai([], {'tipo': 'Aço'}, {'model': 'principal'}))
+
+    assert ai.ultimo_uso == {'error': True}
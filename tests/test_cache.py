@@ -0,0 +1,161 @@
+# test_cache.py
+
+import json
+import sqlite3
+
+import cache as cache_module
+from cache import CacheStore, LRUCache
+
+
+def abrir(tmp_path, **kwargs):
+    return CacheStore(str(tmp_path / 'cache.db'), **kwargs)
+
+
+def linhas_no_disco(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'cache.db'))
+    try:
+        return conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_lru_remove_a_menos_usada():
+    lru = LRUCache(2, ttl=60)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    assert lru.get('a') == 1
+    lru.put('c', 3)
+
+    assert lru.get('b') is None
+    assert lru.get('a') == 1
+    assert lru.get('c') == 3
+
+
+def test_lru_expira_pelo_ttl(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: agora[0])
+    lru = LRUCache(10, ttl=5)
+    lru.put('a', 1)
+
+    agora[0] += 5
+    assert lru.get('a') == 1
+    agora[0] += 6
+    assert lru.get('a') is None
+    assert len(lru) == 0
+
+
+def test_get_many_separa_memoria_disco_e_ausentes(tmp_path):
+    store = abrir(tmp_path)
+    store.salvar('memoria', ['Produto A: descrição'])
+    store.close()
+
+    store = abrir(tmp_path)
+    store.salvar('nova', ['Produto B: descrição'])
+    encontrados = store.get_many(['memoria', 'nova', 'ausente'])
+
+    assert encontrados['memoria']['data'] == ['Produto A: descrição']
+    assert encontrados['nova']['data'] == ['Produto B: descrição']
+    assert 'ausente' not in encontrados
+    assert store.contadores['disk_hits'] == 1
+    assert store.contadores['memory_hits'] == 1
+    assert store.contadores['misses'] == 1
+
+    # A segunda leitura vem toda da memória, inclusive a ausência
+    store.get_many(['memoria', 'ausente'])
+    assert store.contadores['disk_hits'] == 1
+    assert store.contadores['memory_hits'] == 2
+    assert store.contadores['misses'] == 2
+    store.close()
+
+
+def test_chave_ausente_deixa_de_ser_negativa_ao_salvar(tmp_path):
+    store = abrir(tmp_path)
+    assert store.get('url') is None
+    store.salvar('url', ['Produto'])
+
+    assert store.get('url')['data'] == ['Produto']
+    store.close()
+
+
+def test_get_many_divide_consultas_grandes(tmp_path, monkeypatch):
+    store = abrir(tmp_path)
+    chaves = [f"url-{i}" for i in range(1234)]
+    for chave in chaves:
+        store.salvar(chave, [chave])
+    store.close()
+
+    consultas = []
+    store = abrir(tmp_path)
+    store.conn.set_trace_callback(lambda sql: consultas.append(sql) if 'IN (' in sql else None)
+    encontrados = store.get_many(chaves)
+
+    assert len(encontrados) == len(chaves)
+    assert all(encontrados[chave]['data'] == [chave] for chave in chaves)
+    assert len(consultas) == 3  # 500 + 500 + 234
+    store.close()
+
+
+def test_le_linhas_antigas_em_texto_e_ignora_invalidas(tmp_path):
+    store = abrir(tmp_path)
+    with store.conn:
+        store.conn.execute(
+            'INSERT INTO cache (key, data, timestamp) VALUES (?, ?, ?)',
+            ('antiga', json.dumps(["Produto: descrição"], ensure_ascii=False), 1.0)
+        )
+        store.conn.execute('INSERT INTO cache (key, data, timestamp) VALUES (?, ?, ?)', ('quebrada', b'lixo', 1.0))
+
+    encontrados = store.get_many(['antiga', 'quebrada'])
+    assert encontrados['antiga']['data'] == ["Produto: descrição"]
+    assert 'quebrada' not in encontrados
+    store.close()
+
+
+def test_serializacao_ida_e_volta():
+    dados = ["Ação: pH 7 — 100% ✓", {"aninhado": [1, 2.5, None]}]
+    assert cache_module.desserializar(cache_module.serializar(dados)) == dados
+
+
+def test_gravacoes_em_lote(tmp_path):
+    store = abrir(tmp_path, batch_size=3)
+    store.salvar('a', ['A'])
+    assert linhas_no_disco(tmp_path) == 0
+
+    store.salvar('b', ['B'])  # + versão do catálogo: 4 comandos pendentes, passa do lote
+    assert linhas_no_disco(tmp_path) == 2
+
+    store.salvar('c', ['C'])
+    assert linhas_no_disco(tmp_path) == 2
+    store.close()
+    assert linhas_no_disco(tmp_path) == 3
+
+
+def test_versao_do_catalogo_so_muda_com_dados_diferentes(tmp_path):
+    store = abrir(tmp_path)
+    store.salvar('url', ['Produto'])
+    versao = store.versao_catalogo
+
+    store.salvar('url', ['Produto'], etag='"v2"')
+    assert store.versao_catalogo == versao
+
+    store.salvar('url', ['Produto alterado'])
+    assert store.versao_catalogo == versao + 1
+    store.close()
+
+    assert abrir(tmp_path).versao_catalogo == versao + 1
+
+
+def test_manutencao_remove_as_menos_acessadas(tmp_path):
+    store = abrir(tmp_path)
+    for i in range(5):
+        store.salvar(f"url-{i}", [f"Produto {i}"])
+    store.flush()
+    store.get_many([f"url-{i}" for i in range(3)])
+    store.flush()
+
+    opcoes = dict(cache_module.CACHE_DEFAULTS, max_rows=3)
+    removidas, _ = cache_module.executar_manutencao(store.path, opcoes)
+    store.registrar_manutencao(removidas, False)
+
+    assert sorted(removidas) == ['url-3', 'url-4']
+    assert linhas_no_disco(tmp_path) == 3
+    store.close()
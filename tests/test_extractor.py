@@ -0,0 +1,113 @@
+# test_extractor.py
+
+import bs4  # dependência de teste (requirements-dev.txt)
+import pytest
+
+import extractor
+
+PAGINA = """<html><head>{meta}<title>Loja</title></head><body>
+<h1 class="c-dark title-big mb-0">Pé de mesa em madeira maciça</h1>
+<article class="product-text">Acabamento em verniz, ideal para cozinhas e salas de jantar.
+Disponível em carvalho, cerejeira e imbuia; atenção às medidas antes da instalação.</article>
+<h1 class="c-dark title-big mb-0">Puxador cromado "clássico"</h1>
+<article class="product-text">Peça com furação padrão, acompanha parafusos. Não enferruja, garantia de um ano.</article>
+</body></html>"""
+
+
+def produtos_beautifulsoup(pagina):
+    # Mesma extração que o network.py fazia com o BeautifulSoup
+    soup = bs4.BeautifulSoup(pagina, 'html.parser')
+    titulos = soup.find_all('h1', class_='c-dark title-big mb-0')
+    descricoes = soup.find_all('article', class_='product-text')
+    return [
+        f"{titulo.get_text(strip=True)}: {descricao.get_text(strip=True)}"
+        for titulo, descricao in zip(titulos, descricoes)
+    ]
+
+
+def produtos_em_blocos(corpo, tamanho):
+    extrator = extractor.criar_extrator()
+    decoder = extractor.criar_decoder(None)
+    for inicio in range(0, len(corpo), tamanho):
+        extrator.feed(decoder.decode(corpo[inicio:inicio + tamanho]))
+    extrator.feed(decoder.decode(b'', final=True))
+    return extrator.close()
+
+
+TITULO = '<h1 class="c-dark title-big mb-0">'
+
+# HTML com armadilhas de estrutura e o resultado do BeautifulSoup para cada um
+CASOS_ESTRUTURA = {
+    'article aninhado': (
+        TITULO + 'Kit</h1><article class="product-text">Externo <article class="product-text">interno</article>'
+        ' fim</article>' + TITULO + 'Outro</h1>',
+        ['Kit: Externointernofim', 'Outro: interno'],
+    ),
+    'cdata': (
+        TITULO + 'Selante</h1><article class="product-text">Uso <![CDATA[x < y]]> geral</article>',
+        ['Selante: Usox < ygeral'],
+    ),
+    'p sem fechamento': (
+        TITULO + 'Tinta</h1><article class="product-text"><p>Primeira<p>Segunda</article>',
+        ['Tinta: PrimeiraSegunda'],
+    ),
+    'entidades': (
+        TITULO + 'Ferro &amp; A&ccedil;o</h1><article class="product-text">Preço &lt; R$&nbsp;10 &#8212; ok&hellip;</article>',
+        ['Ferro & Aço: Preço < R$\xa010 — ok…'],
+    ),
+    'elementos vazios': (
+        TITULO + 'Cola<br>forte<img src="x.png"></h1><article class="product-text">Fixa <input value="x">bem<hr>rápido</article>',
+        ['Colaforte: Fixabemrápido'],
+    ),
+    'script, style e template': (
+        TITULO + 'Primer</h1><article class="product-text">Antes<script>var a="<b>";</script><style>p{}</style>'
+        '<template>oculto</template>depois</article>',
+        ['Primer: Antesdepois'],
+    ),
+    'ordem das classes': (
+        TITULO + 'Base</h1><article class="product-text">Padrão</article>'
+        '<h1 class="mb-0 c-dark title-big">Ordem</h1><article class="product-text destaque">Desc</article>',
+        ['Base: Padrão'],
+    ),
+    'espaços': (
+        TITULO + '  Verniz\n  marítimo </h1><article class="product-text"> <span>Linha 1</span>\n <b>Linha 2</b> </article>',
+        ['Verniz\n  marítimo: Linha 1Linha 2'],
+    ),
+}
+
+
+@pytest.mark.parametrize('pagina, esperado', list(CASOS_ESTRUTURA.values()), ids=list(CASOS_ESTRUTURA))
+def test_estrutura_igual_ao_beautifulsoup(pagina, esperado):
+    assert produtos_beautifulsoup(pagina) == esperado
+    assert extractor.extrair_produtos(pagina) == esperado
+    assert produtos_em_blocos(pagina.encode('utf-8'), 3) == esperado
+
+
+@pytest.mark.parametrize('meta, codificacao', [
+    ('<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1">', 'iso-8859-1'),
+    ('<meta charset="windows-1252">', 'cp1252'),
+    ('<meta charset="utf-8">', 'utf-8'),
+])
+def test_meta_charset_igual_ao_beautifulsoup(meta, codificacao):
+    corpo = PAGINA.format(meta=meta).encode(codificacao)
+    esperado = produtos_beautifulsoup(corpo)
+
+    assert esperado == produtos_beautifulsoup(PAGINA.format(meta=meta))
+    assert extractor.extrair_produtos_bytes(corpo, None) == esperado
+    assert produtos_em_blocos(corpo, 7) == esperado
+
+
+def test_pagina_sem_charset_detectada_pelo_conteudo():
+    pagina = PAGINA.format(meta='')
+    corpo = pagina.encode('cp1252')
+    esperado = produtos_beautifulsoup(pagina)
+
+    assert extractor.detectar_charset(corpo) == 'cp1252'
+    assert extractor.extrair_produtos_bytes(corpo, None) == esperado
+    assert produtos_em_blocos(corpo, 7) == esperado
+
+
+def test_charset_do_cabecalho_prevalece():
+    pagina = PAGINA.format(meta='<meta charset="utf-8">')
+    corpo = pagina.encode('cp1252')
+    assert extractor.extrair_produtos_bytes(corpo, 'cp1252') == produtos_beautifulsoup(pagina)
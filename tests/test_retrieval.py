@@ -0,0 +1,73 @@
+# test_retrieval.py
+
+from collections import Counter
+
+from retrieval import BM25Index, tokenizar
+
+CATALOGO = [
+    "Primer Epóxi: proteção anticorrosiva para aço carbono",
+    "Verniz Marítimo: acabamento brilhante para madeiras externas",
+    "Desengraxante Alcalino: limpeza de peças de alumínio",
+    "Fosfatizante: pré-tratamento de superfícies metálicas",
+]
+
+
+def indice_do_zero(produtos):
+    indice = BM25Index()
+    indice.atualizar(produtos)
+    return indice
+
+
+def assert_consistente(indice):
+    # O índice incremental deve ser idêntico a um reconstruído do zero
+    esperado = indice_do_zero(indice.ordem)
+    assert indice.postings == esperado.postings
+    assert indice.tamanhos == esperado.tamanhos
+    assert indice.total_termos == esperado.total_termos == sum(indice.tamanhos.values())
+    for produto in indice.ordem:
+        assert Counter(tokenizar(produto)) == {
+            termo: documentos[produto] for termo, documentos in indice.postings.items() if produto in documentos
+        }
+
+
+def test_atualizacao_incremental_mantem_indice_consistente():
+    indice = BM25Index()
+    indice.atualizar(CATALOGO[:3])
+    assert_consistente(indice)
+
+    indice.atualizar(CATALOGO[1:])
+    assert_consistente(indice)
+    assert CATALOGO[0] not in indice.tamanhos
+    assert not any(CATALOGO[0] in documentos for documentos in indice.postings.values())
+
+    indice.atualizar([])
+    assert indice.postings == {}
+    assert indice.total_termos == 0
+
+
+def test_mesma_assinatura_nao_reprocessa():
+    indice = BM25Index()
+    indice.atualizar(CATALOGO, assinatura=('v1',))
+    indice.atualizar(CATALOGO[:1], assinatura=('v1',))
+    assert len(indice) == len(CATALOGO)
+
+
+def test_acentos_e_plurais_correspondem():
+    assert tokenizar("Proteções metálicas") == tokenizar("protecao METALICA")
+    assert tokenizar("Pincéis e papéis") == tokenizar("pincel papel")
+    assert tokenizar("Aço inoxidável") == ["aco", "inoxidavel"]
+
+    indice = indice_do_zero(CATALOGO)
+    assert indice.buscar("superficie metalica", 1) == [CATALOGO[3]]
+    assert indice.buscar("Madeira", 1) == [CATALOGO[1]]
+
+
+def test_busca_sem_termos_em_comum_segue_ordem_do_catalogo():
+    indice = indice_do_zero(CATALOGO)
+    assert indice.buscar("xyz inexistente", 2) == CATALOGO[:2]
+
+
+def test_busca_completa_com_o_restante_do_catalogo():
+    indice = indice_do_zero(CATALOGO)
+    assert indice.buscar("alumínio", 3) == [CATALOGO[2], CATALOGO[0], CATALOGO[1]]
+    assert indice.buscar("alumínio", 0) == CATALOGO
@@ -0,0 +1,57 @@
+# test_scheduler.py
+
+import asyncio
+import time
+
+import cache as cache_module
+import network
+from scheduler import CrawlScheduler
+
+
+def test_urls_em_cache_nao_esperam_pela_taxa_do_host(tmp_path):
+    cache = cache_module.CacheStore(str(tmp_path / 'cache.db'))
+    urls = [f"https://loja.example/produto/{i}" for i in range(40)]
+    for url in urls:
+        cache.salvar(cache_module.chave_url(url), [f"Produto {url}: descrição"])
+    cache.flush()
+
+    agendador = CrawlScheduler({"per_host_rate": 4.0})
+    inicio = time.monotonic()
+    resultados = asyncio.run(agendador.executar(
+        urls,
+        lambda url: network.extrair_conteudo(url, cache, agendador.limiter),
+        default=list
+    ))
+    decorrido = time.monotonic() - inicio
+    cache.close()
+
+    assert resultados == [[f"Produto {url}: descrição"] for url in urls]
+    # A 4 requisições por segundo, 40 URLs levariam cerca de 10 s se fossem limitadas
+    assert decorrido < 1.0
+
+
+def test_taxa_do_host_vale_para_requisicoes_de_rede():
+    agendador = CrawlScheduler({"per_host_rate": 20.0})
+
+    async def job(url):
+        await agendador.limiter.aguardar("loja.example")
+        return url
+
+    inicio = time.monotonic()
+    asyncio.run(agendador.executar([str(i) for i in range(5)], job))
+    assert time.monotonic() - inicio >= 0.15
+
+
+def test_erro_no_callback_de_progresso_nao_trava_a_busca():
+    agendador = CrawlScheduler({"per_host_rate": 0})
+
+    async def job(url):
+        return url.upper()
+
+    def progresso(concluidas, total):
+        raise RuntimeError("widget removido")
+
+    resultados = asyncio.run(asyncio.wait_for(
+        agendador.executar(["a", "b", "c"], job, progresso=progresso), timeout=5
+    ))
+    assert resultados == ["A", "B", "C"]
@@ -0,0 +1,120 @@
+# themes.py
+
+from functools import lru_cache
+
+from PyQt6.QtGui import QColor
+
+# Cores de cada tema
+THEMES = {
+    "dark": {
+        "background": "#1e1e1e",
+        "text": "white",
+        "user_background": "#424242",
+    },
+    "light": {
+        "background": "#f0f0f0",
+        "text": "black",
+        "user_background": "#e0e0e0",
+    },
+}
+
+# Regras de cada tema, válidas abaixo da janela marcada com a propriedade theme
+_REGRAS_TEMA = """
+QWidget[theme="{nome}"], QWidget[theme="{nome}"] QWidget {{
+    background-color: {background};
+    color: {text};
+    font-family: 'Inter';
+}}
+QWidget[theme="{nome}"] QLabel,
+QWidget[theme="{nome}"] QPushButton,
+QWidget[theme="{nome}"] QTextEdit {{
+    color: {text};
+    font-family: 'Inter';
+}}
+"""
+
+# Regras iguais nos dois temas; os widgets são identificados por objectName ou pela propriedade role.
+# O prefixo QWidget iguala a especificidade às regras de tema, e estas regras, por virem depois, prevalecem.
+_REGRAS_COMUNS = """
+QPushButton#themeToggle {
+    border: none;
+    margin-right: 10px;
+}
+QListView#transcript {
+    background: transparent;
+    border: none;
+}
+QTextEdit#messageInput {
+    background-color: #2f2f2f;
+    color: white;
+    border-radius: 20px;
+    padding: 10px 20px;
+    font-size: 14px;
+    border: none;
+    font-family: 'Inter';
+}
+QWidget QPushButton[role="send"] {
+    background-color: #ffffff;
+    border: none;
+    border-radius: 20px;
+    color: black;
+    font-family: 'Inter';
+}
+QWidget QPushButton[role="send"]:hover {
+    background-color: #c1c1c1;
+}
+QWidget QPushButton[role="send"]:pressed {
+    background-color: #b5b5b5;
+}
+QWidget QPushButton[role="clear"] {
+    background-color: #FF4F4F;
+    border: none;
+    border-radius: 20px;
+    color: white;
+    font-family: 'Inter';
+}
+QWidget QPushButton[role="clear"]:hover {
+    background-color: #D13A3A;
+}
+QWidget QPushButton[role="clear"]:pressed {
+    background-color: #A32929;
+}
+QWidget QPushButton[role="send"]:disabled, QWidget QPushButton[role="clear"]:disabled {
+    background-color: #555555;
+}
+"""
+
+
+@lru_cache(maxsize=64)
+def darken_color(color_hex, amount):
+    color = QColor(color_hex)
+    h, s, v, a = color.getHsv()
+    v = max(0, v - amount)
+    color.setHsv(h, s, v, a)
+    return color.name()
+
+
+@lru_cache(maxsize=1)
+def compilar_stylesheet():
+    """Uma única folha de estilos para todos os temas.
+
+    A troca de tema só muda a propriedade ``theme`` da janela; como o texto
+    da folha não muda, o Qt não precisa analisá-lo de novo.
+    """
+    partes = [_REGRAS_TEMA.format(nome=nome, **cores) for nome, cores in THEMES.items()]
+    partes.append(_REGRAS_COMUNS)
+    return "".join(partes)
+
+
+@lru_cache(maxsize=16)
+def cores_mensagens(tema, option_color):
+    # Cores usadas pelo delegate do histórico, já convertidas em QColor
+    cores = THEMES[tema]
+    return {
+        "text": QColor(cores["text"]),
+        "user_background": QColor(cores["user_background"]),
+        "option": QColor(option_color),
+        "option_hover": QColor(darken_color(option_color, 20)),
+        "option_pressed": QColor(darken_color(option_color, 40)),
+        "option_text": QColor("white"),
+    }
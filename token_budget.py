@@ -0,0 +1,95 @@
+# token_budget.py
+
+import logging
+import math
+import re
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken é opcional; sem ele usamos uma estimativa
+    tiktoken = None
+
+# Limites do prompt (podem ser sobrescritos em config['tokens'])
+TOKEN_DEFAULTS = {
+    "prompt_budget": 6000,          # tokens do prompt inteiro (sistema + template + produtos)
+    "max_product_tokens": 200,      # tokens de cada produto; descrições maiores são cortadas
+    "max_completion_tokens": 2048,  # max_tokens pedido ao modelo
+}
+
+_encodings = {}
+_PEDACOS = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_FIM_DE_FRASE = re.compile(r"[.!?;](?=\s|$)")
+
+
+def opcoes_tokens(config):
+    opcoes = dict(TOKEN_DEFAULTS)
+    opcoes.update(config.get('tokens', {}))
+    return opcoes
+
+
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def contar_tokens(texto, model=None):
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(texto))
+    # Estimativa: cerca de 4 caracteres por token em palavras, 1 por pontuação
+    return sum(math.ceil(len(pedaco) / 4) for pedaco in _PEDACOS.findall(texto))
+
+
+def contar_mensagens(messages, model=None):
+    # Cada mensagem do chat custa alguns tokens de marcação além do conteúdo
+    return sum(contar_tokens(m["content"], model) + 4 for m in messages) + 2
+
+
+def truncar_produto(produto, max_tokens, model=None):
+    if max_tokens <= 0 or contar_tokens(produto, model) <= max_tokens:
+        return produto
+    titulo, separador, descricao = produto.partition(": ")
+    if not separador:
+        titulo, descricao = "", produto
+
+    # Busca binária pelo maior prefixo da descrição que cabe no limite
+    baixo, alto = 0, len(descricao)
+    while baixo < alto:
+        meio = (baixo + alto + 1) // 2
+        if contar_tokens(f"{titulo}{separador}{descricao[:meio]}…", model) <= max_tokens:
+            baixo = meio
+        else:
+            alto = meio - 1
+    trecho = descricao[:baixo]
+
+    # Prefere terminar numa frase completa, depois numa palavra inteira
+    frases = list(_FIM_DE_FRASE.finditer(trecho))
+    if frases and frases[-1].end() > len(trecho) // 2:
+        trecho = trecho[:frases[-1].end()]
+    elif " " in trecho:
+        trecho = trecho[:trecho.rfind(" ")].rstrip(" ,;:") + "…"
+    elif trecho:
+        trecho += "…"
+    return f"{titulo}{separador}{trecho}"
+
+
+def empacotar_produtos(produtos, orcamento, max_tokens_produto, model=None):
+    # Produtos chegam em ordem de prioridade (relevância); entram enquanto houver espaço
+    escolhidos = []
+    usados = 0
+    for produto in produtos:
+        produto = truncar_produto(produto, max_tokens_produto, model)
+        custo = contar_tokens(produto + "\n", model)
+        if usados + custo > orcamento:
+            continue
+        escolhidos.append(produto)
+        usados += custo
+    if len(escolhidos) < len(produtos):
+        logging.info(f"Orçamento de tokens: {len(escolhidos)} de {len(produtos)} produtos incluídos ({usados} tokens).")
+    return escolhidos
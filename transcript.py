@@ -0,0 +1,361 @@
+# transcript.py
+
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QRectF, QSize, pyqtSignal
+from PyQt6.QtGui import (
+    QAbstractTextDocumentLayout, QColor, QFont, QFontMetrics, QPainter, QPalette, QTextCursor, QTextDocument
+)
+from PyQt6.QtWidgets import QAbstractItemView, QFrame, QListView, QStyledItemDelegate
+
+# Papéis do modelo além do texto (Qt.ItemDataRole.DisplayRole)
+IS_USER_ROLE = Qt.ItemDataRole.UserRole + 1
+OPTIONS_ROLE = Qt.ItemDataRole.UserRole + 2
+
+# Medidas do balão, equivalentes às margens e ao padding dos antigos QLabel
+MARGEM = 15                 # distância do balão até a borda da lista
+PADDING = 10                # distância do texto até a borda do balão
+ESPACO = 10                 # entre mensagens e entre o balão e as opções
+LARGURA_USUARIO = 0.7       # fração da largura ocupada pelas mensagens do usuário
+LARGURAS_GUARDADAS = 4      # larguras diferentes lembradas por mensagem
+
+FLAGS_TEXTO = int(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop | Qt.TextFlag.TextWordWrap)
+
+
+class Mensagem:
+    __slots__ = ('texto', 'is_user', 'options', 'disposicoes', 'documento', 'cursor')
+
+    def __init__(self, texto, is_user, options=None):
+        self.texto = texto
+        self.is_user = is_user
+        self.options = list(options or [])
+        self.disposicoes = {}   # largura -> Disposicao
+        # Mensagens em streaming guardam o texto num QTextDocument (ver adicionar_documento)
+        self.documento = None
+        self.cursor = None
+
+
+class Disposicao:
+    """Posição do balão, do texto e de cada opção dentro da linha, para uma largura."""
+
+    __slots__ = ('tamanho', 'bolha', 'texto', 'opcoes')
+
+    def __init__(self, tamanho, bolha, texto, opcoes):
+        self.tamanho = tamanho
+        self.bolha = bolha
+        self.texto = texto
+        self.opcoes = opcoes
+
+
+class LinhaTranscript:
+    """Referência a uma mensagem do modelo com a interface de texto de um QLabel."""
+
+    def __init__(self, model, mensagem):
+        self.model = model
+        self.mensagem = mensagem
+
+    def text(self):
+        return self.mensagem.texto
+
+    def setText(self, texto):
+        self.model.definir_texto(self.mensagem, texto)
+
+
+class LinhaDocumento(LinhaTranscript):
+    """Mensagem em streaming: cada pedaço é inserido no fim do documento."""
+
+    def text(self):
+        if self.mensagem.documento is None:
+            return self.mensagem.texto  # linha já removida
+        return self.mensagem.documento.toPlainText()
+
+    def append(self, texto):
+        self.model.acrescentar(self.mensagem, texto)
+
+
+class TranscriptModel(QAbstractListModel):
+    """Mensagens da conversa; nenhum widget é criado por mensagem."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.mensagens = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.mensagens)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        mensagem = self.mensagens[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return mensagem.documento.toPlainText() if mensagem.documento is not None else mensagem.texto
+        if role == IS_USER_ROLE:
+            return mensagem.is_user
+        if role == OPTIONS_ROLE:
+            return mensagem.options
+        return None
+
+    def adicionar(self, texto, is_user, options=None):
+        linha = len(self.mensagens)
+        self.beginInsertRows(QModelIndex(), linha, linha)
+        mensagem = Mensagem(texto, is_user, options)
+        self.mensagens.append(mensagem)
+        self.endInsertRows()
+        return LinhaTranscript(self, mensagem)
+
+    def adicionar_documento(self, fonte, is_user=False):
+        linha = len(self.mensagens)
+        self.beginInsertRows(QModelIndex(), linha, linha)
+        mensagem = Mensagem("", is_user)
+        mensagem.documento = QTextDocument(self)
+        mensagem.documento.setDefaultFont(fonte)
+        mensagem.documento.setDocumentMargin(0)
+        mensagem.cursor = QTextCursor(mensagem.documento)
+        self.mensagens.append(mensagem)
+        self.endInsertRows()
+        return LinhaDocumento(self, mensagem)
+
+    def _linha(self, mensagem):
+        # As mensagens alteradas quase sempre são as últimas
+        for linha in range(len(self.mensagens) - 1, -1, -1):
+            if self.mensagens[linha] is mensagem:
+                return linha
+        return -1
+
+    def definir_texto(self, mensagem, texto):
+        linha = self._linha(mensagem)
+        if linha < 0:
+            return
+        mensagem.texto = texto
+        mensagem.disposicoes.clear()
+        indice = self.index(linha)
+        self.dataChanged.emit(indice, indice, [Qt.ItemDataRole.DisplayRole])
+
+    def acrescentar(self, mensagem, texto):
+        linha = self._linha(mensagem)
+        if linha < 0:
+            return
+        # O cursor fica no fim e mantém o formato; o layout refaz só os blocos alterados
+        mensagem.cursor.movePosition(QTextCursor.MoveOperation.End)
+        mensagem.cursor.insertText(texto)
+        mensagem.disposicoes.clear()
+        indice = self.index(linha)
+        self.dataChanged.emit(indice, indice, [Qt.ItemDataRole.DisplayRole])
+
+    def remover(self, referencia):
+        linha = self._linha(referencia.mensagem)
+        if linha < 0:
+            return
+        self.beginRemoveRows(QModelIndex(), linha, linha)
+        mensagem = self.mensagens.pop(linha)
+        self.endRemoveRows()
+        self._liberar(mensagem)
+
+    def limpar(self):
+        self.beginResetModel()
+        mensagens, self.mensagens = self.mensagens, []
+        self.endResetModel()
+        for mensagem in mensagens:
+            self._liberar(mensagem)
+
+    @staticmethod
+    def _liberar(mensagem):
+        # O documento é filho do modelo; sem isso ficaria vivo até o fim do programa
+        if mensagem.documento is None:
+            return
+        mensagem.texto = mensagem.documento.toPlainText()
+        mensagem.cursor = None
+        mensagem.documento.deleteLater()
+        mensagem.documento = None
+        mensagem.disposicoes.clear()
+
+
+class MessageDelegate(QStyledItemDelegate):
+    """Desenha cada mensagem como balão e guarda a altura calculada por largura."""
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self.fonte = QFont("Inter", 12)
+        self.fonte_usuario = QFont("Inter", 12)
+        self.fonte_opcoes = QFont("Inter", 10)
+        self.cores = {}
+        self.hover = None       # (linha, opção) sob o mouse
+        self.pressionado = None
+
+    def definir_cores(self, cores):
+        self.cores = cores
+
+    def disposicao(self, mensagem, largura):
+        disposicao = mensagem.disposicoes.get(largura)
+        if disposicao is not None:
+            return disposicao
+        if len(mensagem.disposicoes) >= LARGURAS_GUARDADAS:
+            mensagem.disposicoes.clear()
+
+        metricas = QFontMetrics(self.fonte_usuario if mensagem.is_user else self.fonte)
+        interna = max(1, largura - 2 * MARGEM)
+        maxima = max(2 * PADDING + 1, int(largura * LARGURA_USUARIO)) if mensagem.is_user else interna
+        if mensagem.documento is not None:
+            # Só uma largura nova refaz o layout do documento inteiro
+            largura_texto = max(1, maxima - 2 * PADDING)
+            if mensagem.documento.textWidth() != largura_texto:
+                mensagem.documento.setTextWidth(largura_texto)
+            altura = max(metricas.height(), int(mensagem.documento.size().height() + 0.5))
+            caixa = QRect(0, 0, largura_texto, altura)
+        else:
+            caixa = metricas.boundingRect(
+                QRect(0, 0, max(1, maxima - 2 * PADDING), 1 << 24), FLAGS_TEXTO, mensagem.texto or " "
+            )
+        largura_bolha = min(maxima, caixa.width() + 2 * PADDING)
+        x = largura - MARGEM - largura_bolha if mensagem.is_user else MARGEM
+        bolha = QRect(x, ESPACO // 2, largura_bolha, caixa.height() + 2 * PADDING)
+        texto = bolha.adjusted(PADDING, PADDING, -PADDING, -PADDING)
+
+        # Opções em linhas que quebram quando não cabem na largura
+        opcoes = []
+        fundo = bolha.bottom()
+        if mensagem.options:
+            metricas_opcoes = QFontMetrics(self.fonte_opcoes)
+            altura_opcao = metricas_opcoes.height() + 16
+            inicio = MARGEM + PADDING
+            ox, oy = inicio, bolha.bottom() + 1
+            for opcao in mensagem.options:
+                largura_opcao = metricas_opcoes.horizontalAdvance(opcao) + 24
+                if ox > inicio and ox + largura_opcao > largura - MARGEM:
+                    ox, oy = inicio, oy + altura_opcao + ESPACO
+                opcoes.append(QRect(ox, oy, largura_opcao, altura_opcao))
+                ox += largura_opcao + ESPACO
+            fundo = opcoes[-1].bottom() + PADDING
+
+        disposicao = Disposicao(QSize(largura, fundo + 1 + ESPACO // 2), bolha, texto, opcoes)
+        mensagem.disposicoes[largura] = disposicao
+        return disposicao
+
+    def sizeHint(self, option, index):
+        mensagem = index.model().mensagens[index.row()]
+        return self.disposicao(mensagem, self.view.viewport().width()).tamanho
+
+    def paint(self, painter, option, index):
+        mensagem = index.model().mensagens[index.row()]
+        disposicao = self.disposicao(mensagem, option.rect.width())
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.translate(option.rect.topLeft())
+
+        if mensagem.is_user:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(self.cores.get("user_background", QColor("#424242")))
+            painter.drawRoundedRect(disposicao.bolha, 15, 15)
+        if mensagem.documento is not None:
+            self._desenhar_documento(painter, option, mensagem.documento, disposicao.texto)
+        else:
+            painter.setPen(self.cores.get("text", QColor("white")))
+            painter.setFont(self.fonte_usuario if mensagem.is_user else self.fonte)
+            painter.drawText(disposicao.texto, FLAGS_TEXTO, mensagem.texto)
+
+        painter.setFont(self.fonte_opcoes)
+        for posicao, (retangulo, opcao) in enumerate(zip(disposicao.opcoes, mensagem.options)):
+            estado = (index.row(), posicao)
+            if estado == self.pressionado:
+                cor = self.cores.get("option_pressed")
+            elif estado == self.hover:
+                cor = self.cores.get("option_hover")
+            else:
+                cor = self.cores.get("option")
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(cor or QColor("#2B4FFF"))
+            painter.drawRoundedRect(retangulo, 10, 10)
+            painter.setPen(self.cores.get("option_text", QColor("white")))
+            painter.drawText(retangulo, int(Qt.AlignmentFlag.AlignCenter), opcao)
+        painter.restore()
+
+    def _desenhar_documento(self, painter, option, documento, area):
+        # Desenha só a faixa do documento que aparece na tela
+        topo = option.rect.top() + area.top()
+        visivel = QRectF(0, max(0, -topo), area.width(), self.view.viewport().height())
+        contexto = QAbstractTextDocumentLayout.PaintContext()
+        contexto.clip = visivel
+        contexto.palette.setColor(QPalette.ColorRole.Text, self.cores.get("text", QColor("white")))
+        painter.save()
+        painter.translate(area.topLeft())
+        painter.setClipRect(visivel)
+        documento.documentLayout().draw(painter, contexto)
+        painter.restore()
+
+
+class TranscriptView(QListView):
+    """Histórico da conversa: só as linhas visíveis são dispostas e desenhadas."""
+
+    optionSelected = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.transcript_model = TranscriptModel(self)
+        self.delegate = MessageDelegate(self)
+        self.setModel(self.transcript_model)
+        self.setItemDelegate(self.delegate)
+        self.setFrameShape(QFrame.Shape.NoFrame)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(50)
+        self.setUniformItemSizes(False)
+        self.setMouseTracking(True)
+        # O texto mudou: só a altura desta linha precisa ser medida de novo
+        self.transcript_model.dataChanged.connect(
+            lambda inicio, fim, papeis=(): self.delegate.sizeHintChanged.emit(inicio)
+        )
+
+    def _opcao_em(self, posicao):
+        index = self.indexAt(posicao)
+        if not index.isValid():
+            return None, None
+        mensagem = self.transcript_model.mensagens[index.row()]
+        if not mensagem.options:
+            return None, None
+        retangulo = self.visualRect(index)
+        disposicao = self.delegate.disposicao(mensagem, retangulo.width())
+        relativa = posicao - retangulo.topLeft()
+        for numero, opcao in enumerate(disposicao.opcoes):
+            if opcao.contains(relativa):
+                return index, numero
+        return index, None
+
+    def _atualizar_estado(self, atributo, valor):
+        anterior = getattr(self.delegate, atributo)
+        if anterior == valor:
+            return
+        setattr(self.delegate, atributo, valor)
+        for estado in (anterior, valor):
+            if estado is not None:
+                self.update(self.transcript_model.index(estado[0]))
+
+    def mouseMoveEvent(self, event):
+        index, numero = self._opcao_em(event.position().toPoint())
+        self._atualizar_estado('hover', (index.row(), numero) if numero is not None else None)
+        if numero is not None:
+            self.viewport().setCursor(Qt.CursorShape.PointingHandCursor)
+        else:
+            self.viewport().unsetCursor()
+        super().mouseMoveEvent(event)
+
+    def leaveEvent(self, event):
+        self._atualizar_estado('hover', None)
+        super().leaveEvent(event)
+
+    def mousePressEvent(self, event):
+        index, numero = self._opcao_em(event.position().toPoint())
+        if numero is not None and event.button() == Qt.MouseButton.LeftButton:
+            self._atualizar_estado('pressionado', (index.row(), numero))
+        super().mousePressEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        pressionado = self.delegate.pressionado
+        self._atualizar_estado('pressionado', None)
+        index, numero = self._opcao_em(event.position().toPoint())
+        if pressionado is not None and numero is not None and pressionado == (index.row(), numero):
+            self.optionSelected.emit(self.transcript_model.mensagens[index.row()].options[numero])
+        super().mouseReleaseEvent(event)
@@ -0,0 +1,144 @@
+# vector_store.py
+
+import hashlib
+import json
+import logging
+import math
+import os
+import zlib
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional; sem ele a busca vetorial fica desligada
+    np = None
+
+from cache import CACHE_DB
+from retrieval import tokenizar
+
+# Matriz de embeddings e seus metadados, ao lado do cache.db
+VECTOR_FILE = os.path.join(os.path.dirname(CACHE_DB), 'produtos.vec')
+
+
+class HashingEmbedder:
+    """Embedder offline: termos e trigramas de caracteres espalhados por hashing.
+
+    Não precisa de modelo nem de rede, e o mesmo texto sempre gera o mesmo
+    vetor, em qualquer processo.
+    """
+
+    nome = "hashing-v1"
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _atributos(self, texto):
+        termos = tokenizar(texto)
+        for termo in termos:
+            yield "w:" + termo
+            marcado = f"#{termo}#"
+            for i in range(len(marcado) - 2):
+                yield "c:" + marcado[i:i + 3]
+
+    def embed(self, textos):
+        matriz = np.zeros((len(textos), self.dim), dtype=np.float32)
+        for linha, texto in enumerate(textos):
+            for atributo, contagem in Counter(self._atributos(texto)).items():
+                h = zlib.crc32(atributo.encode('utf-8'))
+                sinal = 1.0 if h & 0x80000000 else -1.0
+                matriz[linha, h % self.dim] += sinal * (1.0 + math.log(contagem))
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        return matriz / normas
+
+
+def hash_produto(produto):
+    return hashlib.sha1(produto.encode('utf-8')).hexdigest()
+
+
+class VectorStore:
+    """Embeddings dos produtos numa matriz NumPy mapeada em memória.
+
+    Ao atualizar, só os produtos novos ou alterados passam pelo embedder; as
+    demais linhas são copiadas da matriz anterior.
+    """
+
+    def __init__(self, path=VECTOR_FILE, embedder=None):
+        self.path = path
+        self.meta_path = path + '.json'
+        self.embedder = embedder or HashingEmbedder()
+        self.hashes = []
+        self.produtos = []
+        self.matriz = None
+        self.assinatura = None
+        self._carregar()
+
+    def _carregar(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get('embedder') != self.embedder.nome or meta.get('dim') != self.embedder.dim:
+            logging.info("Embeddings gravados com outro embedder; serão recalculados.")
+            return
+        if not meta.get('hashes'):
+            return
+        try:
+            self.matriz = np.memmap(self.path, dtype=np.float32, mode='r', shape=(len(meta['hashes']), self.embedder.dim))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Não foi possível abrir {self.path}: {e}")
+            return
+        self.hashes = meta['hashes']
+
+    def _gravar(self, matriz, hashes):
+        # Grava num arquivo temporário e troca de uma vez, para nunca deixar meio arquivo
+        temporario = self.path + '.tmp'
+        destino = np.memmap(temporario, dtype=np.float32, mode='w+', shape=matriz.shape)
+        destino[:] = matriz
+        destino.flush()
+        del destino
+        self.matriz = None
+        os.replace(temporario, self.path)
+        with open(self.meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'embedder': self.embedder.nome, 'dim': self.embedder.dim, 'hashes': hashes}, f)
+        os.replace(self.meta_path + '.tmp', self.meta_path)
+        self.matriz = np.memmap(self.path, dtype=np.float32, mode='r', shape=matriz.shape)
+        self.hashes = hashes
+
+    def atualizar(self, produtos, assinatura=None):
+        if assinatura is not None and assinatura == self.assinatura:
+            return
+        produtos = list(dict.fromkeys(produtos))
+        hashes = [hash_produto(p) for p in produtos]
+        self.produtos = produtos
+        self.assinatura = assinatura
+        if hashes == self.hashes and self.matriz is not None:
+            return
+
+        linhas_antigas = {h: i for i, h in enumerate(self.hashes)} if self.matriz is not None else {}
+        matriz = np.empty((len(produtos), self.embedder.dim), dtype=np.float32)
+        reaproveitados = [(i, linhas_antigas[h]) for i, h in enumerate(hashes) if h in linhas_antigas]
+        if reaproveitados:
+            destino, origem = zip(*reaproveitados)
+            matriz[list(destino)] = self.matriz[list(origem)]
+        novos = [i for i, h in enumerate(hashes) if h not in linhas_antigas]
+        if novos:
+            matriz[novos] = self.embedder.embed([produtos[i] for i in novos])
+        logging.info(f"Embeddings atualizados: {len(novos)} calculados, {len(produtos) - len(novos)} reaproveitados.")
+        if len(produtos):
+            self._gravar(matriz, hashes)
+
+    def buscar(self, consulta, k):
+        if self.matriz is None or not self.produtos or len(self.hashes) != len(self.produtos):
+            return []
+        consulta_vetor = self.embedder.embed([consulta])[0]
+        similaridades = self.matriz @ consulta_vetor
+        k = min(k, len(self.produtos)) if k and k > 0 else len(self.produtos)
+        melhores = np.argpartition(-similaridades, k - 1)[:k]
+        melhores = melhores[np.argsort(-similaridades[melhores], kind='stable')]
+        return [self.produtos[i] for i in melhores if similaridades[i] > 0]
+
+
+def disponivel():
+    return np is not None